@@ -5,10 +5,36 @@ import aws_cdk.aws_ec2 as _ec2
 import aws_cdk.aws_iam as _iam
 import aws_cdk.aws_ssm as _ssm
 import aws_cdk.aws_route53 as _r53
+import aws_cdk.aws_route53resolver as _r53resolver
 import aws_cdk.aws_lambda as _lambda
 import aws_cdk.aws_cloudformation as _cf
 import aws_cdk.aws_secretsmanager as _sm
 
+from WorkSpaces.manifest import users_from_context, domain_users
+from WorkSpaces.capacity import free_ips, plan, check
+from WorkSpaces.assets import function_assets
+
+# AWS Managed Microsoft AD always runs at least two domain controllers
+MIN_DOMAIN_CONTROLLERS = 2
+
+# Secrets Manager name prefix for the initial passwords of created domain users
+INITIAL_PASSWORD_PREFIX = "workspaces/initial-password/"
+
+
+def domain_controller_count(node, users):
+    # "DomainControllers": { "count": N } or { "users_per_dc": N }, None keeps the default
+    _dcs = node.try_get_context("DomainControllers")
+    if not _dcs:
+        return None
+    if "count" in _dcs:
+        count = int(_dcs["count"])
+    else:
+        per_dc = int(_dcs["users_per_dc"])
+        if per_dc < 1:
+            raise ValueError("DomainControllers users_per_dc must be at least 1, got {}".format(_dcs["users_per_dc"]))
+        count = (len(users) + per_dc - 1) // per_dc
+    return max(count, MIN_DOMAIN_CONTROLLERS)
+
 
 class AWSManagedAD(core.Stack):
 
@@ -23,6 +49,25 @@ class AWSManagedAD(core.Stack):
         _subnet2 = self.node.try_get_context("Subnet2")
         _sm_ec2keypair = self.node.try_get_context("Secret_keypair_arn")
         _ec2instance = self.node.try_get_context("Instance_type")
+        _edition = self.node.try_get_context("AD_edition") or "Standard"
+        _dnsmode = self.node.try_get_context("AD_dns_mode") or "hostedzone"
+        _wssubnets = self.node.try_get_context("WorkSpacesSubnets")
+        _headroom = int(self.node.try_get_context("WorkSpacesCapacityHeadroom") or 10)
+
+        _users = users_from_context(self.node)
+        _dccount = domain_controller_count(self.node, _users)
+
+        # WorkSpaces get their ENIs in dedicated subnets if given, else in the AD subnets
+        adsubnets = [ tuple(_subnet1), tuple(_subnet2) ]
+        wssubnets = [ tuple(s) for s in _wssubnets ] if _wssubnets else adsubnets
+
+        # Fail fast if the planned fleet does not fit, counting the other ENIs in the AD subnets
+        _dcs = _dccount or MIN_DOMAIN_CONTROLLERS
+        otherips = {
+            _subnet1[0]: (_dcs + 1) // 2 + 1 + (_dnsmode == "resolver"),
+            _subnet2[0]: _dcs // 2 + (_dnsmode == "resolver")
+        }
+        check(plan(wssubnets, free_ips(self.node, _vpcID), len(_users), otherips, _headroom), len(_users))
 
         # Import Vpc from the existing one in the AWS Account
         Vpc = _ec2.Vpc.from_lookup(self,"ImportVPC",vpc_id = _vpcID)
@@ -44,12 +89,12 @@ class AWSManagedAD(core.Stack):
             secret_arn = _sm_ec2keypair
         )
 
-        # Create an AWS Managed AD Service in STANDARD Version
+        # Create an AWS Managed AD Service, STANDARD Version unless AD_edition says otherwise
         ad = _ds.CfnMicrosoftAD(
             self,"ManagedAD",
             name = _dname,
             password = secret_adpassword.secret_value_from_json("Key").to_string(),
-            edition = "Standard",
+            edition = _edition,
             vpc_settings =
                 { "vpcId": _vpcID,
                   "subnetIds": [ _subnet1[0], _subnet2[0] ]
@@ -58,22 +103,85 @@ class AWSManagedAD(core.Stack):
 
         self.directory = ad
 
-        # Create r53 hosted Zone for DNS DomainName
-        hostedzone = _r53.HostedZone(
-            self, "HostedZoneforAD",
-            zone_name = _dname,
-            vpcs = [Vpc]
-        )
+        # Get the DNS IPs from AWS Managed AD, or from all DCs once they are scaled out
+        dnsips = ad.attr_dns_ip_addresses
+        if _dccount:
+            dnsips = core.Fn.split(",", self.scale_domain_controllers(ad, _dccount).get_att("DnsIpAddrs").to_string())
 
-        # Get the DNS IPs from AWS Managed AD
-        targetip = _r53.RecordTarget(values = ad.attr_dns_ip_addresses)
+        if _dnsmode == "hostedzone":
+            # Create r53 hosted Zone for DNS DomainName
+            hostedzone = _r53.HostedZone(
+                self, "HostedZoneforAD",
+                zone_name = _dname,
+                vpcs = [Vpc]
+            )
 
-        # Create A Record on Route 53 to point to AWS Managed AD IPs to later EC2 to join Domain
-        r53Arecord = _r53.ARecord(
-            self, "RecordAforAD",
-            target = targetip,
-            zone = hostedzone
-        )
+            targetip = _r53.RecordTarget(values = dnsips)
+
+            # Create A Record on Route 53 to point to AWS Managed AD IPs to later EC2 to join Domain
+            r53Arecord = _r53.ARecord(
+                self, "RecordAforAD",
+                target = targetip,
+                zone = hostedzone
+            )
+            dnsready = r53Arecord.node.default_child
+
+        elif _dnsmode == "dhcp":
+            # Hand out the AD DNS servers to every instance in the VPC through DHCP
+            dhcpoptions = _ec2.CfnDHCPOptions(
+                self, "DHCPOptionsForAD",
+                domain_name = _dname,
+                domain_name_servers = dnsips
+            )
+            dnsready = _ec2.CfnVPCDHCPOptionsAssociation(
+                self, "DHCPOptionsAssociationForAD",
+                dhcp_options_id = dhcpoptions.ref,
+                vpc_id = _vpcID
+            )
+
+        elif _dnsmode == "resolver":
+            # Forward queries for the AD domain from the VPC resolver to the DCs
+            resolversg = _ec2.SecurityGroup(
+                self, "SGForResolver",
+                vpc = Vpc,
+                description = "The Security Group for the Route 53 Resolver endpoint forwarding to AWS Managed AD"
+            )
+            resolverendpoint = _r53resolver.CfnResolverEndpoint(
+                self, "ResolverEndpointForAD",
+                direction = "OUTBOUND",
+                ip_addresses = [ { "subnetId": _subnet1[0] }, { "subnetId": _subnet2[0] } ],
+                security_group_ids = [ resolversg.security_group_id ]
+            )
+            resolverrule = _r53resolver.CfnResolverRule(
+                self, "ResolverRuleForAD",
+                domain_name = _dname,
+                rule_type = "FORWARD",
+                resolver_endpoint_id = resolverendpoint.attr_resolver_endpoint_id,
+                target_ips = [
+                    { "ip": core.Fn.select(i, dnsips), "port": "53" }
+                    for i in range(_dccount or MIN_DOMAIN_CONTROLLERS)
+                ]
+            )
+            dnsready = _r53resolver.CfnResolverRuleAssociation(
+                self, "ResolverRuleAssociationForAD",
+                resolver_rule_id = resolverrule.attr_resolver_rule_id,
+                vpc_id = _vpcID
+            )
+
+        else:
+            raise ValueError("AD_dns_mode must be hostedzone, dhcp or resolver, not {}".format(_dnsmode))
+
+        # With a hosted zone, each instance has to point its adapter at the AD DNS servers itself
+        dnssteps = [
+            "    # Set up the IPv4 addresses of all AD DNS servers as the first DNS servers on this machine",
+            "    $ipdns = ([System.Net.Dns]::GetHostAddresses(\"{}\").IPAddressToString)".format(_dname),
+            "    $index = 1",
+            "    foreach ($ip in $ipdns) {",
+            "        netsh.exe interface ipv4 add dnsservers name=$networkAdapterName address=$ip index=$index",
+            "        $index++",
+            "    }",
+            ""
+        ] if _dnsmode == "hostedzone" else []
 
         # Create Policy to EC2JoinDomain Role
         ec2ssmpolicy = _iam.PolicyDocument(
@@ -196,6 +304,9 @@ class AWSManagedAD(core.Stack):
 
         adadminEC2.instance.add_depends_on(ad)
 
+        # The instance resolves the domain as it boots and joins, so DNS has to be in place first
+        adadminEC2.instance.add_depends_on(dnsready)
+
         # Create a SSM Parameter Store for Domain Name
         domain = _ssm.StringParameter(
             self, "ADDomainName",
@@ -241,7 +352,6 @@ class AWSManagedAD(core.Stack):
                             "    $domainJoinPasswordParameterStore = \"{}\"".format(secret_adpassword.secret_arn),
                             "",
                             "    # Retrieve configuration values from parameters",
-                            "    $ipdns = ([System.Net.Dns]::GetHostAddresses(\"{}\").IPAddressToString[0])".format(_dname),
                             "    $domain = (Get-SSMParameterValue -Name $domainNameParameterStore).Parameters[0].Value",
                             "    $username = $domain + \"\\\" + (Get-SSMParameterValue -Name $domainJoinUserNameParameterStore).Parameters[0].Value",
                             "    $password = ((Get-SECSecretValue -SecretId $domainJoinPasswordParameterStore ).SecretString | ConvertFrom-Json ).Key | ConvertTo-SecureString -asPlainText -Force ",
@@ -253,9 +363,7 @@ class AWSManagedAD(core.Stack):
                             "    $networkAdapter = Get-WmiObject Win32_NetworkAdapter -Filter \"AdapterType = 'Ethernet 802.3'\"",
                             "    $networkAdapterName = ($networkAdapter | Select-Object -First 1).NetConnectionID",
                             "",
-                            "    # Set up the IPv4 address of the AD DNS server as the first DNS server on this machine",
-                            "    netsh.exe interface ipv4 add dnsservers name=$networkAdapterName address=$ipdns index=1",
-                            "",
+                            *dnssteps,
                             "    # Join the domain and reboot",
                             "    Add-Computer -DomainName $domain -Credential $credential",
                             "    Restart-Computer -Force",
@@ -283,6 +391,12 @@ class AWSManagedAD(core.Stack):
         )
 
         ssmjoinad.add_depends_on(ssmdocument)
+        ssmjoinad.add_depends_on(dnsready)
+
+        # Create the WorkSpaces domain users from the admin instance, no need to RDP into it
+        _domainusers = domain_users(self.node)
+        if _domainusers:
+            self.create_domain_users(adadminEC2, ssmrole, ssmjoinad, _domainusers, _dname, _sm_password, "Admin")
 
         # Create a Policy for Lambda Role
         lambdapolicy = _iam.PolicyDocument(
@@ -302,6 +416,9 @@ class AWSManagedAD(core.Stack):
                     actions = [
                     "workspaces:RegisterWorkspaceDirectory",
                     "workspaces:DeregisterWorkspaceDirectory",
+                    "workspaces:DescribeWorkspaceDirectories",
+                    "workspaces:DescribeWorkspaces",
+                    "workspaces:TerminateWorkspaces",
                     "ds:DescribeDirectories",
                     "ds:AuthorizeApplication",
                     "ds:UnauthorizeApplication",
@@ -334,17 +451,181 @@ class AWSManagedAD(core.Stack):
             runtime = _lambda.Runtime.PYTHON_3_7,
             handler = "workspaceds.handler",
             role = lambdarole,
-            code=_lambda.Code.asset('lambda'),
+            **function_assets(self, "workspaceds"),
             environment={
                 "DIRECTORY_ID": ad.ref
             },
             timeout = core.Duration.seconds(120)
         )
+
+        # Let the function re-invoke itself while the registration is still running
+        dsinvokepolicy = _iam.Policy(
+            self, "LambdaSelfInvokeForRegisterDS",
+            roles = [ lambdarole ],
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [ "lambda:InvokeFunction" ],
+                    resources = [ dslambda.function_arn ]
+                )
+            ]
+        )
+
         # Create a customResource to trigger Lambda function after Lambda function is created
-        _cf.CfnCustomResource(
+        registerds = _cf.CfnCustomResource(
             self, "InvokeLambdaFunction",
             service_token = dslambda.function_arn
         )
+        # Register with the WorkSpaces subnets, a change sends an Update the function checks
+        registerds.add_property_override("SubnetIds", [ s[0] for s in wssubnets ])
+        registerds.node.add_dependency(lambdarole)
+        registerds.node.add_dependency(dsinvokepolicy)
+
+    # Scale the directory out to count domain controllers and wait until they are active
+    def scale_domain_controllers(self, ad, count):
+        dcrole = _iam.Role(
+            self, "LambdaRoleForDomainControllers",
+            assumed_by = _iam.ServicePrincipal('lambda.amazonaws.com'),
+            inline_policies = { "LambdaScaleDomainControllers": _iam.PolicyDocument(
+                statements = [
+                    _iam.PolicyStatement(
+                        actions = [
+                        "logs:CreateLogGroup",
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents"
+                        ],
+                        resources = [ "arn:aws:logs:{}:{}:*".format(self.region,self.account) ]
+                    ),
+                    _iam.PolicyStatement(
+                        actions = [
+                        "ds:DescribeDomainControllers",
+                        "ds:UpdateNumberOfDomainControllers",
+                        "ec2:DescribeSubnets",
+                        "ec2:DescribeVpcs",
+                        "ec2:CreateNetworkInterface",
+                        "ec2:DescribeNetworkInterfaces",
+                        "ec2:AuthorizeSecurityGroupIngress",
+                        "ec2:AuthorizeSecurityGroupEgress",
+                        "ec2:CreateTags"
+                        ],
+                        resources = [ "*" ]
+                    )
+                ]
+            ) }
+        )
+
+        dclambda = _lambda.Function(
+            self, "LambdaDomainControllersFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "dcscaling.handler",
+            role = dcrole,
+            **function_assets(self, "dcscaling"),
+            timeout = core.Duration.minutes(15)
+        )
+
+        # Let the function re-invoke itself while the new DCs come up
+        dcinvokepolicy = _iam.Policy(
+            self, "LambdaSelfInvokeForDomainControllers",
+            roles = [ dcrole ],
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [ "lambda:InvokeFunction" ],
+                    resources = [ dclambda.function_arn ]
+                )
+            ]
+        )
+
+        dcs = _cf.CfnCustomResource(
+            self, "DomainControllers",
+            service_token = dclambda.function_arn
+        )
+        dcs.add_property_override("DirectoryId", ad.ref)
+        dcs.add_property_override("DesiredNumber", count)
+        dcs.node.add_dependency(dcrole)
+        dcs.node.add_dependency(dcinvokepolicy)
+        return dcs
+
+    # Create domain users through SSM Run Command on the admin instance and wait for the result
+    def create_domain_users(self, instance, instancerole, joinad, users, domain, password_arn, admin):
+        # The script stores each new user's initial password in a secret for an admin to hand out
+        passwordpolicy = _iam.Policy(
+            self, "InitialPasswordsForDomainUsers",
+            roles = [ instancerole ],
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [
+                    "secretsmanager:CreateSecret",
+                    "secretsmanager:PutSecretValue"
+                    ],
+                    resources = [ "arn:aws:secretsmanager:{}:{}:secret:{}*".format(
+                        self.region, self.account, INITIAL_PASSWORD_PREFIX) ]
+                )
+            ]
+        )
+
+        usersrole = _iam.Role(
+            self, "LambdaRoleForDomainUsers",
+            assumed_by = _iam.ServicePrincipal('lambda.amazonaws.com'),
+            inline_policies = { "LambdaCreateDomainUsers": _iam.PolicyDocument(
+                statements = [
+                    _iam.PolicyStatement(
+                        actions = [
+                        "logs:CreateLogGroup",
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents"
+                        ],
+                        resources = [ "arn:aws:logs:{}:{}:*".format(self.region,self.account) ]
+                    ),
+                    _iam.PolicyStatement(
+                        actions = [
+                        "ssm:SendCommand",
+                        "ssm:GetCommandInvocation",
+                        "ssm:DescribeInstanceInformation",
+                        "ssm:DescribeInstanceAssociationsStatus"
+                        ],
+                        resources = [ "*" ]
+                    )
+                ]
+            ) }
+        )
+
+        userslambda = _lambda.Function(
+            self, "LambdaDomainUsersFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "domainusers.handler",
+            role = usersrole,
+            **function_assets(self, "domainusers"),
+            timeout = core.Duration.minutes(15)
+        )
+
+        # Let the function re-invoke itself until the instance has joined
+        usersinvokepolicy = _iam.Policy(
+            self, "LambdaSelfInvokeForDomainUsers",
+            roles = [ usersrole ],
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [ "lambda:InvokeFunction" ],
+                    resources = [ userslambda.function_arn ]
+                )
+            ]
+        )
+
+        domainusers = _cf.CfnCustomResource(
+            self, "DomainUsers",
+            service_token = userslambda.function_arn
+        )
+        domainusers.add_property_override("InstanceId", instance.instance_id)
+        # The function waits for this association to join the instance before it sends the script
+        domainusers.add_property_override("JoinAssociationId", joinad.attr_association_id)
+        domainusers.add_property_override("DomainName", domain)
+        domainusers.add_property_override("PasswordSecretArn", password_arn)
+        domainusers.add_property_override("AdminUser", admin)
+        domainusers.add_property_override("Users", users)
+        domainusers.add_property_override("InitialPasswordPrefix", INITIAL_PASSWORD_PREFIX)
+        domainusers.add_depends_on(joinad)
+        domainusers.node.add_dependency(usersrole)
+        domainusers.node.add_dependency(usersinvokepolicy)
+        domainusers.node.add_dependency(passwordpolicy)
+        return domainusers
 
     # Return AWS Managed AD Directory Service ID for WorkSpaces creation
     def get_ad(self):
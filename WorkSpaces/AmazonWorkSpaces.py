@@ -2,21 +2,125 @@ from aws_cdk import core
 import aws_cdk.aws_directoryservice as _ds
 import aws_cdk.aws_workspaces as _ws
 import aws_cdk.aws_ec2 as _ec2
+import aws_cdk.aws_cloudformation as _cf
+import aws_cdk.aws_ssm as _ssm
+
+from WorkSpaces.manifest import users_from_context, shard
+from WorkSpaces.tiers import load_tiers, tier_of, report
+from WorkSpaces.SAPGUIBundlePipeline import VERSION_TAG
+
+
+# Number of nested stacks the fleet is hashed over. Changing it moves WorkSpaces
+# between nested stacks, which replaces them, so it is chosen once per fleet
+DEFAULT_SHARDS = 10
+
+# CloudFormation allows 500 resources per template
+MAX_WORKSPACES_PER_STACK = 450
+
+
+def workspace_props(entry, default_bundle, default_tags = None, tier = None):
+    # Build the CfnWorkspace properties shared by single and fleet mode
+    tier = tier or {}
+    props = {
+        "bundle_id": entry.bundle or default_bundle,
+        "user_name": entry.user
+    }
+    tags = dict(entry.tags)
+    if not entry.bundle and default_tags:
+        tags = dict(default_tags, **tags)
+
+    # The tier profile sets running mode and volumes, a compute type in the manifest wins
+    properties = {
+        "compute_type_name": entry.compute_type or tier.get("compute_type"),
+        "running_mode": tier.get("running_mode"),
+        "running_mode_auto_stop_timeout_in_minutes": tier.get("auto_stop_minutes"),
+        "root_volume_size_gib": tier.get("root_volume_gib"),
+        "user_volume_size_gib": tier.get("user_volume_gib")
+    }
+    properties = { k: v for k, v in properties.items() if v is not None }
+    if properties:
+        props["workspace_properties"] = _ws.CfnWorkspace.WorkspacePropertiesProperty(**properties)
+    if tier.get("encrypt_root_volume") or tier.get("encrypt_user_volume"):
+        props["root_volume_encryption_enabled"] = bool(tier.get("encrypt_root_volume"))
+        props["user_volume_encryption_enabled"] = bool(tier.get("encrypt_user_volume"))
+        props["volume_encryption_key"] = tier.get("kms_key", "alias/aws/workspaces")
+    if tags:
+        props["tags"] = [ core.CfnTag(key = k, value = v) for k, v in tags.items() ]
+    return props
+
+
+class WorkSpacesShard(_cf.NestedStack):
+
+    def __init__(self, scope: core.Construct, id: str, entries, default_bundle, directory_id, default_tags = None, tiers = None, default_tier = None, **kwargs) -> None:
+        super().__init__(scope, id, parameters = { "DirectoryId": directory_id, "BundleId": default_bundle }, **kwargs)
+
+        # Directory and default bundle are handed over from the parent stack as parameters
+        _directory = core.CfnParameter(self, "DirectoryId", type = "String")
+        _bundle = core.CfnParameter(self, "BundleId", type = "String")
+
+        for entry in entries:
+            _ws.CfnWorkspace(
+                self, "WorkSpaces-{}".format(entry.user.replace("\\", "-")),
+                directory_id = _directory.value_as_string,
+                **workspace_props(entry, _bundle.value_as_string, default_tags,
+                                  (tiers or {}).get(tier_of(entry, tiers or {}, default_tier)))
+            )
 
 
 class AWSWorkSpaces(core.Stack):
 
-    def __init__(self, scope: core.Construct, id: str, directory, **kwargs) -> None:
+    def __init__(self, scope: core.Construct, id: str, directory, bundle = None, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
         # The code that defines your stack goes here
-        _user = self.node.try_get_context("WorkSpacesUser")
         _windows = self.node.try_get_context("WorkSpacesBundle")
+        _manifest = self.node.try_get_context("WorkSpacesManifest")
+        _shards = int(self.node.try_get_context("WorkSpacesShards") or DEFAULT_SHARDS)
+        _tags = {}
+
+        # Prefer the SAP GUI bundle from the pipeline over the stock bundle. It is read from
+        # the version's SSM parameter at deploy time, so a new bundle needs no export change
+        if bundle is not None:
+            _windows = _ssm.StringParameter.value_for_string_parameter(self, bundle.parameter_name)
+            _tags = { VERSION_TAG: bundle.version }
+
+        users = users_from_context(self.node)
+
+        # Tier profiles, with an estimate of what the fleet costs and how fast it resumes
+        _tiers, _default_tier = load_tiers(self.node)
+        if _tiers:
+            report(users, _tiers, _default_tier)
+
+        if not _manifest:
+            #build up a workspaces based on windows 10 bundle_id
+            ws = _ws.CfnWorkspace(
+                self,"WorkSpaces",
+                directory_id = directory.get_ad().ref,
+                **workspace_props(users[0], _windows, _tags,
+                                  _tiers.get(tier_of(users[0], _tiers, _default_tier)))
+            )
+            return
+
+        # Fleet mode: hash the users over nested stacks, which CloudFormation deploys in parallel.
+        # The stack of a user never depends on who else is in the manifest
+        shards = shard(users, _shards)
+        largest = max(len(entries) for entries in shards)
+        if largest > MAX_WORKSPACES_PER_STACK:
+            raise ValueError(
+                "A nested stack would hold {} WorkSpaces, more than {}. Raise WorkSpacesShards, "
+                "which moves existing WorkSpaces between nested stacks and replaces them".format(
+                    largest, MAX_WORKSPACES_PER_STACK))
 
-        #build up a workspaces based on windows 10 bundle_id
-        ws = _ws.CfnWorkspace(
-            self,"WorkSpaces",
-            bundle_id = _windows,
-            directory_id = directory.get_ad().ref,
-            user_name = _user
-        )
+        self.shards = [
+            WorkSpacesShard(
+                self, "WorkSpacesShard{}".format(index),
+                entries = entries,
+                default_bundle = _windows,
+                default_tags = _tags,
+                tiers = _tiers,
+                default_tier = _default_tier,
+                directory_id = directory.get_ad().ref
+            )
+            for index, entries in enumerate(shards)
+            if entries
+        ]
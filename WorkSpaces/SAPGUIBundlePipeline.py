@@ -0,0 +1,104 @@
+from aws_cdk import core
+import aws_cdk.aws_iam as _iam
+import aws_cdk.aws_lambda as _lambda
+import aws_cdk.aws_ssm as _ssm
+import aws_cdk.aws_cloudformation as _cf
+
+from WorkSpaces.assets import function_assets
+
+
+# Tag that records the SAP GUI version on images, bundles and WorkSpaces
+VERSION_TAG = "SAPGUIVersion"
+
+# SSM parameters the function writes, /sapgui/bundle/<version> holds the bundle ID
+PARAMETER_PREFIX = "/sapgui/bundle/"
+
+
+class SAPGUIBundlePipeline(core.Stack):
+
+    def __init__(self, scope: core.Construct, id: str, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+
+        # SAP GUI version and the WorkSpace it was installed and configured on
+        _bundle = self.node.try_get_context("SAPGUIBundle")
+
+        self.version = _bundle["version"]
+        # Other stacks read the bundle ID from here, an export could not change with the version
+        self.parameter_name = PARAMETER_PREFIX + self.version
+
+        # Create a Policy for the bundle pipeline Lambda Role
+        pipelinepolicy = _iam.PolicyDocument(
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents"
+                    ],
+                    resources = [ "arn:aws:logs:{}:{}:*".format(self.region,self.account) ]
+                ),
+                _iam.PolicyStatement(
+                    actions = [
+                    "workspaces:CreateWorkspaceImage",
+                    "workspaces:DescribeWorkspaceImages",
+                    "workspaces:CreateWorkspaceBundle",
+                    "workspaces:DescribeWorkspaceBundles",
+                    "workspaces:CreateTags"
+                    ],
+                    resources = [ "*" ]
+                ),
+                _iam.PolicyStatement(
+                    actions = [ "ssm:PutParameter" ],
+                    resources = [ "arn:aws:ssm:{}:{}:parameter/sapgui/bundle/*".format(self.region,self.account) ]
+                )
+            ]
+        )
+
+        pipelinerole = _iam.Role(
+            self, "LambdaRoleForBundlePipeline",
+            assumed_by = _iam.ServicePrincipal('lambda.amazonaws.com'),
+            inline_policies = { "LambdaBuildSAPGUIBundle": pipelinepolicy }
+        )
+
+        # Create a Lambda function to capture the image and create the bundle
+        pipelinelambda = _lambda.Function(
+            self, "LambdaBundlePipelineFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "bundlepipeline.handler",
+            role = pipelinerole,
+            **function_assets(self, "bundlepipeline"),
+            timeout = core.Duration.minutes(15)
+        )
+
+        # Let the function re-invoke itself while the image is created
+        pipelineinvokepolicy = _iam.Policy(
+            self, "LambdaSelfInvokeForBundlePipeline",
+            roles = [ pipelinerole ],
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [ "lambda:InvokeFunction" ],
+                    resources = [ pipelinelambda.function_arn ]
+                )
+            ]
+        )
+
+        # A new version changes the properties, so CloudFormation builds a new bundle
+        bundle = _cf.CfnCustomResource(
+            self, "SAPGUIBundle",
+            service_token = pipelinelambda.function_arn
+        )
+        bundle.add_property_override("Version", self.version)
+        bundle.add_property_override("BuilderWorkspaceId", _bundle["builder_workspace_id"])
+        bundle.add_property_override("ComputeType", _bundle.get("compute_type", "STANDARD"))
+        bundle.add_property_override("RootVolumeSizeGib", _bundle.get("root_volume_gib", 80))
+        bundle.add_property_override("UserVolumeSizeGib", _bundle.get("user_volume_gib", 50))
+        bundle.node.add_dependency(pipelinerole)
+        bundle.node.add_dependency(pipelineinvokepolicy)
+
+        # The function keeps /sapgui/bundle/<version> for every version it built, this
+        # parameter only points at the current one, so a version bump never replaces it
+        _ssm.StringParameter(
+            self, "SAPGUIBundleVersion",
+            parameter_name = PARAMETER_PREFIX + "current",
+            string_value = bundle.get_att("BundleId").to_string()
+        )
@@ -0,0 +1,134 @@
+from aws_cdk import core
+import aws_cdk.aws_dynamodb as _ddb
+import aws_cdk.aws_events as _events
+import aws_cdk.aws_events_targets as _targets
+import aws_cdk.aws_iam as _iam
+import aws_cdk.aws_lambda as _lambda
+
+from WorkSpaces.assets import function_assets
+
+
+# WorkSpaces API calls that change what the inventory knows about a WorkSpace
+INVENTORY_EVENTS = [
+    "CreateWorkspaces",
+    "TerminateWorkspaces",
+    "StartWorkspaces",
+    "StopWorkspaces",
+    "RebootWorkspaces",
+    "RebuildWorkspaces",
+    "RestoreWorkspace",
+    "MigrateWorkspace",
+    "ModifyWorkspaceProperties",
+    "ModifyWorkspaceState"
+]
+
+
+class WorkSpacesInventory(core.Stack):
+
+    def __init__(self, scope: core.Construct, id: str, directory, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+
+        _inventory = self.node.try_get_context("WorkSpacesInventory") or {}
+        _reconcile = int(_inventory.get("reconcile_minutes", 60))
+        _recheck = int(_inventory.get("recheck_minutes", 5))
+
+        # Create a DynamoDB table keyed by WorkSpace, with an index per question asked
+        self.table = _ddb.Table(
+            self, "InventoryTable",
+            partition_key = _ddb.Attribute(name = "WorkspaceId", type = _ddb.AttributeType.STRING),
+            billing_mode = _ddb.BillingMode.PAY_PER_REQUEST
+        )
+        for index, attribute in [ ( "ByUser", "UserName" ), ( "ByBundle", "BundleId" ), ( "ByState", "State" ) ]:
+            self.table.add_global_secondary_index(
+                index_name = index,
+                partition_key = _ddb.Attribute(name = attribute, type = _ddb.AttributeType.STRING)
+            )
+
+        # Create a Policy for the inventory Lambda Role
+        inventorypolicy = _iam.PolicyDocument(
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents"
+                    ],
+                    resources = [ "arn:aws:logs:{}:{}:*".format(self.region,self.account) ]
+                ),
+                _iam.PolicyStatement(
+                    actions = [ "workspaces:DescribeWorkspaces" ],
+                    resources = [ "*" ]
+                )
+            ]
+        )
+
+        inventoryrole = _iam.Role(
+            self, "LambdaRoleForInventory",
+            assumed_by = _iam.ServicePrincipal('lambda.amazonaws.com'),
+            inline_policies = { "LambdaWorkSpacesInventory": inventorypolicy }
+        )
+        self.table.grant_read_write_data(inventoryrole)
+
+        environment = {
+            "INVENTORY_TABLE": self.table.table_name,
+            "DIRECTORY_ID": directory.get_ad().ref
+        }
+
+        # Keep the table current from WorkSpaces API calls recorded by CloudTrail
+        eventlambda = _lambda.Function(
+            self, "LambdaInventoryEventFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "inventory.event_handler",
+            role = inventoryrole,
+            **function_assets(self, "inventory"),
+            environment = environment,
+            timeout = core.Duration.seconds(60)
+        )
+
+        _events.Rule(
+            self, "InventoryEvents",
+            event_pattern = _events.EventPattern(
+                source = [ "aws.workspaces" ],
+                detail_type = [ "AWS API Call via CloudTrail" ],
+                detail = { "eventName": INVENTORY_EVENTS }
+            ),
+            targets = [ _targets.LambdaFunction(eventlambda) ]
+        )
+
+        # An API call leaves a WorkSpace in a transient state (STARTING, STOPPING, ...),
+        # describe those again until they settle
+        rechecklambda = _lambda.Function(
+            self, "LambdaInventoryRecheckFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "inventory.recheck_handler",
+            role = inventoryrole,
+            **function_assets(self, "inventory"),
+            environment = environment,
+            timeout = core.Duration.seconds(60)
+        )
+
+        _events.Rule(
+            self, "InventoryRecheckSchedule",
+            schedule = _events.Schedule.rate(core.Duration.minutes(_recheck)),
+            targets = [ _targets.LambdaFunction(rechecklambda) ]
+        )
+
+        # Catch state changes no API call reports, like AutoStop, writing only the differences
+        reconcilelambda = _lambda.Function(
+            self, "LambdaInventoryReconcileFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "inventory.reconcile_handler",
+            role = inventoryrole,
+            **function_assets(self, "inventory"),
+            environment = environment,
+            memory_size = 512,
+            timeout = core.Duration.minutes(5)
+        )
+
+        _events.Rule(
+            self, "InventoryReconcileSchedule",
+            schedule = _events.Schedule.rate(core.Duration.minutes(_reconcile)),
+            targets = [ _targets.LambdaFunction(reconcilelambda) ]
+        )
+
+        core.CfnOutput(self, "InventoryTableName", value = self.table.table_name)
@@ -0,0 +1,119 @@
+from aws_cdk import core
+import aws_cdk.aws_cloudwatch as _cw
+import aws_cdk.aws_events as _events
+import aws_cdk.aws_events_targets as _targets
+import aws_cdk.aws_iam as _iam
+import aws_cdk.aws_lambda as _lambda
+
+from WorkSpaces.assets import function_assets
+
+
+# Namespace the collector publishes its Embedded Metric Format logs to
+NAMESPACE = "WorkSpaces/SAPGUI"
+
+WORKSPACE_STATES = [ "AVAILABLE", "STOPPED", "PENDING", "STARTING", "STOPPING", "REBOOTING", "UNHEALTHY", "ERROR" ]
+CONNECTION_STATES = [ "CONNECTED", "DISCONNECTED", "UNKNOWN" ]
+
+
+class WorkSpacesMonitoring(core.Stack):
+
+    def __init__(self, scope: core.Construct, id: str, directory, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+
+        # How often to collect, and how far back to look for StartWorkspaces calls
+        _monitoring = self.node.try_get_context("WorkSpacesMonitoring") or {}
+        _schedule = int(_monitoring.get("schedule_minutes", 5))
+        _period = int(_monitoring.get("period_minutes", 60))
+
+        directory_id = directory.get_ad().ref
+
+        # Create a Policy for the metrics collector Lambda Role
+        collectorpolicy = _iam.PolicyDocument(
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents"
+                    ],
+                    resources = [ "arn:aws:logs:{}:{}:*".format(self.region,self.account) ]
+                ),
+                _iam.PolicyStatement(
+                    actions = [
+                    "workspaces:DescribeWorkspaces",
+                    "workspaces:DescribeWorkspacesConnectionStatus",
+                    "cloudtrail:LookupEvents"
+                    ],
+                    resources = [ "*" ]
+                )
+            ]
+        )
+
+        collectorrole = _iam.Role(
+            self, "LambdaRoleForMetrics",
+            assumed_by = _iam.ServicePrincipal('lambda.amazonaws.com'),
+            inline_policies = { "LambdaCollectWorkSpacesMetrics": collectorpolicy }
+        )
+
+        # Create a Lambda function that logs all metrics as one EMF document per run
+        collector = _lambda.Function(
+            self, "LambdaMetricsFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "metrics.handler",
+            role = collectorrole,
+            **function_assets(self, "metrics"),
+            memory_size = 512,
+            environment = {
+                "DIRECTORY_ID": directory_id,
+                "METRICS_NAMESPACE": NAMESPACE,
+                "PERIOD_MINUTES": str(_period)
+            },
+            timeout = core.Duration.minutes(5)
+        )
+
+        _events.Rule(
+            self, "MetricsSchedule",
+            schedule = _events.Schedule.rate(core.Duration.minutes(_schedule)),
+            targets = [ _targets.LambdaFunction(collector) ]
+        )
+
+        def metric(name, statistic = "Maximum"):
+            return _cw.Metric(
+                namespace = NAMESPACE,
+                metric_name = name,
+                dimensions = { "DirectoryId": directory_id },
+                statistic = statistic,
+                period = core.Duration.minutes(_schedule)
+            )
+
+        dashboard = _cw.Dashboard(
+            self, "WorkSpacesDashboard",
+            # Unique per landscape, several environments can share a region
+            dashboard_name = "{}-{}".format(self.stack_name, self.region)
+        )
+        dashboard.add_widgets(
+            _cw.GraphWidget(
+                title = "WorkSpaces by state",
+                left = [ metric("State_{}".format(s)) for s in WORKSPACE_STATES ],
+                stacked = True,
+                width = 12
+            ),
+            _cw.GraphWidget(
+                title = "WorkSpaces by connection state",
+                left = [ metric("Connection_{}".format(s)) for s in CONNECTION_STATES ],
+                stacked = True,
+                width = 12
+            )
+        )
+        dashboard.add_widgets(
+            _cw.GraphWidget(
+                title = "Resume to connected (s)",
+                left = [ metric("ResumeToConnectedSeconds", s) for s in ( "p50", "p95", "Maximum" ) ],
+                width = 12
+            ),
+            _cw.GraphWidget(
+                title = "Time since last user connection (s)",
+                left = [ metric("SecondsSinceLastConnection", s) for s in ( "p50", "p95" ) ],
+                width = 12
+            )
+        )
@@ -0,0 +1,107 @@
+from aws_cdk import core
+import aws_cdk.aws_iam as _iam
+import aws_cdk.aws_lambda as _lambda
+
+from WorkSpaces.assets import function_assets
+
+
+def schedule_expression(shift_start, lead_minutes, days):
+    # cron expression for lead_minutes before shift_start ("HH:MM") on the given days
+    hour, minute = [ int(x) for x in shift_start.split(":") ]
+    start = hour * 60 + minute - lead_minutes
+    if start < 0:
+        raise ValueError("Pre-warming for a {} shift start would begin on the previous day".format(shift_start))
+    return "cron({} {} ? * {} *)".format(start % 60, start // 60, days)
+
+
+class WorkSpacesPrewarm(core.Stack):
+
+    def __init__(self, scope: core.Construct, id: str, directory, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+
+        # User groups to pre-warm, each with its own schedule and time zone
+        _groups = self.node.try_get_context("WorkSpacesPrewarm") or []
+
+        # Create a Policy for the pre-warming Lambda Role
+        prewarmpolicy = _iam.PolicyDocument(
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents"
+                    ],
+                    resources = [ "arn:aws:logs:{}:{}:*".format(self.region,self.account) ]
+                ),
+                _iam.PolicyStatement(
+                    actions = [
+                    "workspaces:DescribeWorkspaces",
+                    "workspaces:DescribeTags",
+                    "workspaces:StartWorkspaces"
+                    ],
+                    resources = [ "*" ]
+                )
+            ]
+        )
+
+        prewarmrole = _iam.Role(
+            self, "LambdaRoleForPrewarm",
+            assumed_by = _iam.ServicePrincipal('lambda.amazonaws.com'),
+            inline_policies = { "LambdaPrewarmWorkSpaces": prewarmpolicy }
+        )
+
+        # Create a Lambda function to start AutoStop WorkSpaces ahead of the shift
+        prewarmlambda = _lambda.Function(
+            self, "LambdaPrewarmFunction",
+            runtime = _lambda.Runtime.PYTHON_3_7,
+            handler = "prewarm.handler",
+            role = prewarmrole,
+            **function_assets(self, "prewarm"),
+            timeout = core.Duration.minutes(15)
+        )
+
+        # Let the function re-invoke itself to keep waiting until shift start
+        _iam.Policy(
+            self, "LambdaSelfInvokeForPrewarm",
+            roles = [ prewarmrole ],
+            statements = [
+                _iam.PolicyStatement(
+                    actions = [ "lambda:InvokeFunction" ],
+                    resources = [ prewarmlambda.function_arn ]
+                )
+            ]
+        )
+
+        # Role for EventBridge Scheduler to invoke the function
+        schedulerrole = _iam.Role(
+            self, "SchedulerRoleForPrewarm",
+            assumed_by = _iam.ServicePrincipal('scheduler.amazonaws.com')
+        )
+        prewarmlambda.grant_invoke(schedulerrole)
+
+        # One schedule per user group, EventBridge Scheduler evaluates it in the group's time zone
+        for group in _groups:
+            lead = int(group.get("lead_minutes", 30))
+            core.CfnResource(
+                self, "PrewarmSchedule-{}".format(group["name"]),
+                type = "AWS::Scheduler::Schedule",
+                properties = {
+                    "Description": "Pre-warm WorkSpaces of {} before the {} shift".format(group["name"], group["shift_start"]),
+                    "ScheduleExpression": schedule_expression(group["shift_start"], lead, group.get("days", "MON-FRI")),
+                    "ScheduleExpressionTimezone": group.get("timezone", "UTC"),
+                    "FlexibleTimeWindow": { "Mode": "OFF" },
+                    "Target": {
+                        "Arn": prewarmlambda.function_arn,
+                        "RoleArn": schedulerrole.role_arn,
+                        "Input": self.to_json_string({
+                            "Group": group["name"],
+                            "DirectoryId": directory.get_ad().ref,
+                            "Tags": group.get("tags", {}),
+                            "Users": group.get("users", []),
+                            "LeadMinutes": lead,
+                            "RampMinutes": int(group.get("ramp_minutes", 10)),
+                            "MaxInFlight": int(group.get("max_in_flight", 4))
+                        })
+                    }
+                }
+            )
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import jsii
+from aws_cdk import core
+import aws_cdk.aws_lambda as _lambda
+
+
+# Source of all functions, and the modules they share through one layer
+LAMBDA_SOURCE = "lambda"
+SHARED_MODULES = [ "cfnresponse", "clients", "retry", "continuation", "tracing" ]
+BUILD_DIR = os.path.join(".build", "lambda")
+
+_staged = {}
+
+
+def _digest(files):
+    # Content hash over file names and bytes, equal content gives the same directory
+    digest = hashlib.sha256()
+    for name, path in sorted(files.items()):
+        digest.update(name.encode())
+        with open(path, "rb") as fp:
+            digest.update(hashlib.sha256(fp.read()).digest())
+    return digest.hexdigest()[:16]
+
+
+def stage(name, files):
+    """Copy files ({ relative name: source path }) into a content addressed build directory.
+
+    Unchanged content resolves to the existing directory, so nothing is copied again and
+    CDK computes the same asset hash and skips the upload.
+    """
+    key = (name, tuple(sorted(files.items())))
+    if key in _staged:
+        return _staged[key]
+
+    target = os.path.join(BUILD_DIR, "{}-{}".format(name, _digest(files)))
+    if not os.path.isdir(target):
+        os.makedirs(BUILD_DIR, exist_ok = True)
+        # Stage next to the target and rename, parallel synths of several environments share the build directory
+        tmp = tempfile.mkdtemp(prefix = ".{}-".format(name), dir = BUILD_DIR)
+        os.chmod(tmp, 0o755)
+        for relative, source in files.items():
+            os.makedirs(os.path.join(tmp, os.path.dirname(relative)), exist_ok = True)
+            shutil.copyfile(source, os.path.join(tmp, relative))
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            if not os.path.isdir(target):
+                raise
+            shutil.rmtree(tmp, ignore_errors = True)
+
+    _staged[key] = target
+    return target
+
+
+def shared_layer(scope):
+    """The layer with the shared runtime modules, created once per stack."""
+    stack = core.Stack.of(scope)
+    layer = stack.node.try_find_child("SharedLambdaLayer")
+    if layer is None:
+        files = {
+            os.path.join("python", m + ".py"): os.path.join(LAMBDA_SOURCE, m + ".py")
+            for m in SHARED_MODULES
+        }
+        layer = _lambda.LayerVersion(
+            stack, "SharedLambdaLayer",
+            code = _lambda.Code.asset(stage("layer", files)),
+            compatible_runtimes = [ _lambda.Runtime.PYTHON_3_7 ],
+            description = "cfnresponse, clients, retry, continuation and tracing helpers"
+        )
+    return layer
+
+
+def function_assets(scope, module):
+    """Code and layers for a _lambda.Function whose handler lives in lambda/<module>.py."""
+    code = _lambda.Code.asset(stage(module, { module + ".py": os.path.join(LAMBDA_SOURCE, module + ".py") }))
+    return { "code": code, "layers": [ shared_layer(scope) ] }
+
+
+@jsii.implements(core.IAspect)
+class EnableTracing(object):
+    """Turn on the per-call tracing of lambda/tracing.py in every function it is applied to."""
+
+    def visit(self, node):
+        if isinstance(node, _lambda.Function):
+            node.add_environment("TRACING", "1")
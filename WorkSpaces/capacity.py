@@ -0,0 +1,97 @@
+import ipaddress
+import json
+import os
+import sys
+
+
+# AWS reserves the first four and the last IP address of every subnet
+RESERVED_PER_SUBNET = 5
+
+# File where the CDK CLI caches context lookups such as Vpc.from_lookup
+CONTEXT_FILE = "cdk.context.json"
+
+
+class SubnetCapacityError(Exception):
+    pass
+
+
+def _cached_lookup_subnets(vpc_id, path = CONTEXT_FILE):
+    # Subnet CIDRs from a cached Vpc.from_lookup, if the CDK version records them
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fp:
+        cached = json.load(fp)
+    subnets = {}
+    for key, value in cached.items():
+        if not key.startswith("vpc-provider:") or not isinstance(value, dict) or value.get("vpcId") != vpc_id:
+            continue
+        for group in value.get("subnetGroups", []):
+            for subnet in group.get("subnets", []):
+                if subnet.get("cidr"):
+                    size = ipaddress.ip_network(subnet["cidr"]).num_addresses - RESERVED_PER_SUBNET
+                    subnets[subnet["subnetId"]] = {
+                        "az": subnet.get("availabilityZone"),
+                        "available": size,
+                        "estimated": True
+                    }
+    return subnets
+
+
+def free_ips(node, vpc_id):
+    """Free IPs per subnet: SubnetCapacity from tools/subnet_capacity.py, else CIDR sizes from the VPC lookup."""
+    subnets = _cached_lookup_subnets(vpc_id)
+    subnets.update(node.try_get_context("SubnetCapacity") or {})
+    return subnets
+
+
+def plan(subnets, capacity, workspaces, other, headroom):
+    """Check that the subnets can take the fleet and return the report rows.
+
+    subnets is a list of (subnet ID, AZ), other maps subnet IDs to IPs used by
+    resources other than WorkSpaces. WorkSpaces spread over all subnets, so each
+    subnet needs its share plus headroom. The IPs of planned WorkSpaces that are
+    deployed already ("workspaces" in capacity) are not free, but they count as
+    available to the fleet.
+    """
+    share = (workspaces + len(subnets) - 1) // len(subnets)
+    needed = share + (share * headroom + 99) // 100
+
+    rows = []
+    for subnet_id, az in subnets:
+        known = capacity.get(subnet_id)
+        available = known["available"] if known else None
+        deployed = known.get("workspaces", 0) if known else 0
+        required = needed + other.get(subnet_id, 0)
+        rows.append({
+            "subnet": subnet_id,
+            "az": az,
+            "available": available,
+            "deployed": deployed,
+            "estimated": bool(known and known.get("estimated")),
+            "required": required,
+            "ok": available is None or available + deployed >= required
+        })
+    return rows
+
+
+def format_report(rows, workspaces):
+    lines = [ "Subnet capacity for {} WorkSpaces:".format(workspaces),
+              "{:<26} {:<14} {:>10} {:>9} {:>9}  {}".format("Subnet", "AZ", "Free IPs", "Deployed", "Needed", "") ]
+    for r in rows:
+        free = "unknown" if r["available"] is None else "{}{}".format(r["available"], "~" if r["estimated"] else "")
+        status = "OK" if r["ok"] else "TOO SMALL"
+        if r["available"] is None:
+            status = "not checked, run tools/subnet_capacity.py"
+        lines.append("{:<26} {:<14} {:>10} {:>9} {:>9}  {}".format(
+            r["subnet"], r["az"], free, r["deployed"], r["required"], status))
+    return "\n".join(lines)
+
+
+def check(rows, workspaces, out = sys.stderr):
+    # Fail synth with the report when a subnet is too small, stay quiet without capacity data
+    if all(r["available"] is None for r in rows):
+        return
+    report = format_report(rows, workspaces)
+    out.write(report + "\n")
+    if not all(r["ok"] for r in rows):
+        raise SubnetCapacityError(report)
@@ -0,0 +1,53 @@
+from WorkSpaces.AWSManagedAD import AWSManagedAD
+from WorkSpaces.AmazonWorkSpaces import AWSWorkSpaces
+from WorkSpaces.WorkSpacesPrewarm import WorkSpacesPrewarm
+from WorkSpaces.SAPGUIBundlePipeline import SAPGUIBundlePipeline
+from WorkSpaces.WorkSpacesMonitoring import WorkSpacesMonitoring
+from WorkSpaces.WorkSpacesInventory import WorkSpacesInventory
+
+
+def build(app, env = None, prefix = ""):
+    """Create the stacks of one SAP landscape, the optional ones when their context key is set."""
+    stacks = {}
+
+    AD = stacks["AWSManagedAD"] = AWSManagedAD(
+        app, prefix + "AWSManagedAD",
+        env = env
+    )
+
+    bundle = None
+    if app.node.try_get_context("SAPGUIBundle"):
+        bundle = stacks["SAPGUIBundlePipeline"] = SAPGUIBundlePipeline(
+            app, prefix + "SAPGUIBundlePipeline",
+            env = env
+        )
+
+    # Deploys after AWSManagedAD, which also creates the domain users, so both go in one pass
+    workspaces = stacks["AWSWorkSpaces"] = AWSWorkSpaces(
+        app, prefix + "AWSWorkSpaces", AD, bundle,
+        env = env
+    )
+    workspaces.add_dependency(AD)
+    if bundle is not None:
+        # Reads the bundle ID from the SSM parameter the pipeline writes
+        workspaces.add_dependency(bundle)
+
+    if app.node.try_get_context("WorkSpacesPrewarm"):
+        stacks["WorkSpacesPrewarm"] = WorkSpacesPrewarm(
+            app, prefix + "WorkSpacesPrewarm", AD,
+            env = env
+        )
+
+    if app.node.try_get_context("WorkSpacesMonitoring"):
+        stacks["WorkSpacesMonitoring"] = WorkSpacesMonitoring(
+            app, prefix + "WorkSpacesMonitoring", AD,
+            env = env
+        )
+
+    if app.node.try_get_context("WorkSpacesInventory"):
+        stacks["WorkSpacesInventory"] = WorkSpacesInventory(
+            app, prefix + "WorkSpacesInventory", AD,
+            env = env
+        )
+
+    return stacks
@@ -0,0 +1,105 @@
+import collections
+import csv
+import hashlib
+import json
+import os
+
+
+# Columns understood in a CSV manifest, or keys in a JSON manifest entry
+MANIFEST_FIELDS = [ "user", "bundle", "compute_type", "tags", "tier", "first_name", "last_name", "email" ]
+
+
+class WorkSpacesUserEntry(object):
+
+    def __init__(self, user, bundle = None, compute_type = None, tags = None, **extra):
+        self.user = user
+        self.bundle = bundle or None
+        self.compute_type = compute_type or None
+        self.tags = tags or {}
+        self.extra = extra
+
+
+def _parse_tags(value):
+    # CSV manifests carry tags as "Key1=Value1;Key2=Value2"
+    if isinstance(value, dict):
+        return value
+    tags = {}
+    for pair in (value or "").split(";"):
+        if not pair.strip():
+            continue
+        key, _, val = pair.partition("=")
+        tags[key.strip()] = val.strip()
+    return tags
+
+
+def _entry(row, source):
+    row = { k.strip(): v for k, v in row.items() if k }
+    if not row.get("user"):
+        raise ValueError("Manifest {} has an entry without a user: {}".format(source, row))
+    row["tags"] = _parse_tags(row.get("tags"))
+    return WorkSpacesUserEntry(**row)
+
+
+def load_manifest(path):
+    """Read a WorkSpaces user manifest (CSV or JSON) into a list of entries."""
+    with open(path) as fp:
+        if os.path.splitext(path)[1].lower() == ".json":
+            rows = json.load(fp)
+        else:
+            rows = list(csv.DictReader(fp))
+
+    entries = [ _entry(row, path) for row in rows ]
+
+    counts = collections.Counter(e.user for e in entries)
+    duplicates = sorted(u for u, n in counts.items() if n > 1)
+    if duplicates:
+        raise ValueError("Manifest {} lists users more than once: {}".format(path, ", ".join(duplicates)))
+
+    return entries
+
+
+def users_from_context(node):
+    """Return the WorkSpaces users for this app, from the manifest or the single WorkSpacesUser."""
+    _manifest = node.try_get_context("WorkSpacesManifest")
+    if _manifest:
+        return load_manifest(_manifest)
+
+    return [ WorkSpacesUserEntry(node.try_get_context("WorkSpacesUser")) ]
+
+
+def domain_users(node):
+    """Domain users to create in AD, from DomainUsers or from manifest entries that carry an email."""
+    _users = node.try_get_context("DomainUsers")
+    if _users is None:
+        _users = [
+            dict(user = e.user, **e.extra) for e in users_from_context(node)
+            if e.user and e.extra.get("email")
+        ]
+
+    # AD wants the sAMAccountName, WorkSpaces user names may carry a NETBIOS\ prefix
+    return [
+        {
+            "SamAccountName": u["user"].split("\\")[-1],
+            "GivenName": u.get("first_name") or u["user"].split("\\")[-1],
+            "Surname": u.get("last_name") or "",
+            "EmailAddress": u["email"]
+        }
+        for u in _users
+    ]
+
+
+def shard_of(user, count):
+    # Stable across runs and manifest order, unlike hash() and positions
+    return int(hashlib.sha256(user.lower().encode("utf-8")).hexdigest(), 16) % count
+
+
+def shard(entries, count):
+    """Split entries into count shards by a hash of the user name.
+
+    A user stays in the same shard when others are added or removed, as long as
+    count does not change.
+    """
+    shards = [ [] for _ in range(count) ]
+    for entry in entries:
+        shards[shard_of(entry.user, count)].append(entry)
+    return shards
@@ -0,0 +1,59 @@
+import sys
+
+
+# Resume latency users of a running mode should expect when they log in
+RESUME_LATENCY = {
+    "ALWAYS_ON": "none, always running",
+    "AUTO_STOP": "resume on login, about 1-2 minutes after idle"
+}
+
+
+def load_tiers(node):
+    """Tier profiles from WorkSpacesTiers, and the tier for users without one."""
+    _tiers = node.try_get_context("WorkSpacesTiers") or {}
+    _default = node.try_get_context("WorkSpacesDefaultTier")
+    if _default and _default not in _tiers:
+        raise ValueError("WorkSpacesDefaultTier {} is not defined in WorkSpacesTiers".format(_default))
+    for name, tier in _tiers.items():
+        mode = tier.get("running_mode", "AUTO_STOP")
+        if mode not in RESUME_LATENCY:
+            raise ValueError("Tier {} has running_mode {}, expected one of {}".format(
+                name, mode, ", ".join(sorted(RESUME_LATENCY))))
+    return _tiers, _default
+
+
+def tier_of(entry, tiers, default):
+    name = entry.extra.get("tier") or default
+    if name and name not in tiers:
+        raise ValueError("User {} is assigned to the unknown tier {}".format(entry.user, name))
+    return name
+
+
+def monthly_cost(tier):
+    # Fixed monthly fee, plus usage hours for AutoStop WorkSpaces
+    cost = float(tier.get("monthly_cost", 0))
+    if tier.get("running_mode", "AUTO_STOP") == "AUTO_STOP":
+        cost += float(tier.get("hourly_cost", 0)) * float(tier.get("hours_per_month", 0))
+    return cost
+
+
+def report(entries, tiers, default, out = sys.stderr):
+    """Print users, estimated monthly cost and resume latency per tier at synth time."""
+    counts = {}
+    for entry in entries:
+        name = tier_of(entry, tiers, default) or "(bundle defaults)"
+        counts[name] = counts.get(name, 0) + 1
+
+    rows = []
+    for name, users in sorted(counts.items()):
+        tier = tiers.get(name, {})
+        mode = tier.get("running_mode", "AUTO_STOP")
+        rows.append(( name, users, mode, tier.get("compute_type", "-"), users * monthly_cost(tier), RESUME_LATENCY[mode] ))
+
+    out.write("{:<18} {:>6} {:<10} {:<12} {:>12}  {}\n".format(
+        "Tier", "Users", "Mode", "Compute", "Est. $/month", "Resume latency"))
+    for row in rows:
+        out.write("{:<18} {:>6} {:<10} {:<12} {:>12.2f}  {}\n".format(*row))
+    out.write("{:<18} {:>6} {:<10} {:<12} {:>12.2f}\n".format(
+        "Fleet", sum(r[1] for r in rows), "", "", sum(r[4] for r in rows)))
+    return rows
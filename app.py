@@ -2,25 +2,27 @@
 
 from aws_cdk import core
 
-from WorkSpaces.AWSManagedAD import AWSManagedAD
-from WorkSpaces.AmazonWorkSpaces import AWSWorkSpaces
+from WorkSpaces.landscape import build
+from WorkSpaces.assets import EnableTracing
 
 
 app = core.App()
 
+# Select one landscape from the Environments matrix, e.g. cdk synth -c Environment=QAS
+_environment = app.node.try_get_context("Environment")
+if _environment:
+    for key, value in app.node.try_get_context("Environments")[_environment].items():
+        app.node.set_context(key, value)
+
+# Log timing, retries and errors of every AWS call in the Lambda functions: cdk deploy -c LambdaTracing=true
+if str(app.node.try_get_context("LambdaTracing") or "").lower() in ( "1", "true" ):
+    app.node.apply_aspect(EnableTracing())
+
 env_workspaces = core.Environment(
         account = app.node.try_get_context("Account"),
         region = app.node.try_get_context("Region")
       )
 
-AD = AWSManagedAD(
-    app, "AWSManagedAD",
-    env = env_workspaces
-)
-
-AWSWorkSpaces(
-    app, "AWSWorkSpaces", AD,
-    env = env_workspaces
-)
+build(app, env_workspaces)
 
 app.synth()
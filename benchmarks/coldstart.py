@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+# Cold-start benchmark for the directory registration Lambda (lambda/workspaceds.py).
+#
+# Measures, each in a fresh interpreter, the module import time and the latency of
+# the first and of a warm invocation against a local fake WorkSpaces endpoint, and
+# lists the most expensive imports reported by `python -X importtime`.
+#
+#   $ python3 benchmarks/coldstart.py --runs 10 --max-import-ms 50
+#
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from fakeaws import FakeAWS, fake_credentials
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LAMBDA_DIR = os.path.join(ROOT, "lambda")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import workspaceds
+imported = time.perf_counter()
+from fakeaws import FakeContext, cfn_event
+workspaceds.handler(cfn_event("Update", "{url}/cfn", request_id = "first"), FakeContext())
+first = time.perf_counter()
+workspaceds.handler(cfn_event("Update", "{url}/cfn", request_id = "warm"), FakeContext())
+warm = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_ms": (first - imported) * 1000,
+    "warm_ms": (warm - first) * 1000
+}}))
+"""
+
+
+def child_env(url):
+    env = fake_credentials(os.environ, url)
+    env["PYTHONPATH"] = os.pathsep.join([ LAMBDA_DIR, BENCH_DIR ])
+    env["DIRECTORY_ID"] = "d-1234567890"
+    return env
+
+
+def measure(url, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [ sys.executable, "-c", CHILD.format(url = url) ],
+            env = child_env(url), cwd = LAMBDA_DIR,
+            check = True, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL
+        ).stdout.decode()
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return samples
+
+
+def import_profile(url, top):
+    # Parse `-X importtime` output: "import time: self [us] | cumulative | imported package"
+    err = subprocess.run(
+        [ sys.executable, "-X", "importtime", "-c", "import workspaceds" ],
+        env = child_env(url), cwd = LAMBDA_DIR,
+        check = True, stdout = subprocess.DEVNULL, stderr = subprocess.PIPE
+    ).stderr.decode()
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse = True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Cold-start benchmark for lambda/workspaceds.py")
+    parser.add_argument("--runs", type = int, default = 10)
+    parser.add_argument("--top", type = int, default = 10)
+    parser.add_argument("--max-import-ms", type = float, help = "fail if the median import time is higher")
+    parser.add_argument("--max-first-ms", type = float, help = "fail if the median first invocation is slower")
+    args = parser.parse_args()
+
+    fake = FakeAWS({ "DescribeWorkspaceDirectories": { "Directories": [ { "State": "REGISTERED" } ] } }).start()
+    try:
+        samples = measure(fake.url, args.runs)
+        profile = import_profile(fake.url, args.top)
+    finally:
+        fake.stop()
+
+    medians = { key: statistics.median(s[key] for s in samples) for key in samples[0] }
+    print("median over {} cold starts:".format(args.runs))
+    for key, value in medians.items():
+        print("  {:<10} {:8.1f} ms".format(key, value))
+    print("most expensive imports (cumulative):")
+    for cumulative, name in profile:
+        print("  {:8.1f} ms  {}".format(cumulative / 1000.0, name))
+
+    failed = (args.max_import_ms and medians["import_ms"] > args.max_import_ms) or \
+             (args.max_first_ms and medians["first_ms"] > args.max_first_ms)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCH_DIR, "synth_baseline.json")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("synth suite")
+    group.addoption("--sizes", type = int, nargs = "+", default = [ 1, 100, 500, 1000 ],
+                    help = "fleet sizes to synthesize")
+    group.addoption("--environments", type = int, nargs = "+", default = [ 1, 3 ],
+                    help = "numbers of environments to synthesize")
+    group.addoption("--baseline", default = BASELINE)
+    group.addoption("--update-baseline", action = "store_true",
+                    help = "store the results as the new baseline instead of comparing")
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        metafunc.parametrize("size", metafunc.config.getoption("sizes"))
+    if "environments" in metafunc.fixturenames:
+        metafunc.parametrize("environments", metafunc.config.getoption("environments"))
+
+
+def pytest_configure(config):
+    config.synth_results = []
+
+
+@pytest.fixture(scope = "session")
+def baseline(pytestconfig):
+    path = pytestconfig.getoption("baseline")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fp:
+        return json.load(fp)
+
+
+@pytest.fixture
+def record(pytestconfig):
+    return pytestconfig.synth_results.append
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = getattr(config, "synth_results", [])
+    if not results:
+        return
+    write = terminalreporter.write_line
+    write("{:>10} {:>5} {:>10} {:>10} {:>12} {:>10} {:>12}".format(
+        "WorkSpaces", "Envs", "Templates", "Resources", "Total bytes", "Synth s", "Peak RSS MB"))
+    for r in results:
+        write("{workspaces:>10} {environments:>5} {templates:>10} {resources:>10} {total_bytes:>12} "
+              "{synth_seconds:>10.2f} {peak:>12.1f}".format(peak = r["peak_rss_kb"] / 1024.0, **r))
+
+    if config.getoption("update_baseline"):
+        path = config.getoption("baseline")
+        stored = {}
+        if os.path.exists(path):
+            with open(path) as fp:
+                stored = json.load(fp)
+        stored.update(("{}x{}".format(r["workspaces"], r["environments"]), r) for r in results)
+        with open(path, "w") as fp:
+            json.dump(stored, fp, indent = 2, sort_keys = True)
+        write("Baseline written to {}".format(path))
@@ -0,0 +1,142 @@
+#
+# A local stand-in for the AWS JSON APIs and the CloudFormation ResponseURL,
+# so the Lambda functions can run offline.
+#
+# boto3 is pointed at it with AWS_ENDPOINT_URL_<SERVICE>, e.g.
+# AWS_ENDPOINT_URL_WORKSPACES=http://127.0.0.1:<port>. Operations are answered
+# from canned responses; a PUT is recorded as a CloudFormation response, and a
+# Lambda Invoke is handed to on_invoke so re-invocation chains can be followed.
+#
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeAWS(object):
+
+    def __init__(self, responses = None, latency = 0.0, throttle_rate = 0.0,
+                 callback_latency = 0.0, callback_failure_rate = 0.0, on_invoke = None):
+        # responses: operation name -> dict, or callable(request dict) -> dict
+        self.responses = dict(responses or {})
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.callback_latency = callback_latency
+        self.callback_failure_rate = callback_failure_rate
+        self.on_invoke = on_invoke
+        self.calls = []
+        self.cfn_attempts = 0
+        self.cfn_responses = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self._body() or b"{}")
+                if self.path.endswith("/invocations"):
+                    # Lambda Invoke is a REST call, the body is the event of the new invocation
+                    with fake.lock:
+                        fake.calls.append((time.time(), "Invoke"))
+                    if fake.on_invoke:
+                        fake.on_invoke(request)
+                    return self._reply(202, {})
+                operation = self.headers.get("X-Amz-Target", "").split(".")[-1]
+                with fake.lock:
+                    fake.calls.append((time.time(), operation))
+                if fake.latency:
+                    time.sleep(random.uniform(0, 2 * fake.latency))
+                if random.random() < fake.throttle_rate:
+                    return self._reply(400, { "__type": "ThrottlingException", "message": "Rate exceeded" })
+                response = fake.responses.get(operation, {})
+                self._reply(200, response(request) if callable(response) else response)
+
+            def do_PUT(self):
+                body = json.loads(self._body())
+                with fake.lock:
+                    fake.cfn_attempts += 1
+                if fake.callback_latency:
+                    time.sleep(random.uniform(0, 2 * fake.callback_latency))
+                if random.random() < fake.callback_failure_rate:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with fake.lock:
+                    fake.cfn_responses.append((time.time(), body))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeContext(object):
+    # The parts of the Lambda context object the functions use
+
+    def __init__(self, timeout = 120.0, function_arn = "arn:aws:lambda:us-west-2:123456789012:function:bench"):
+        self.deadline = time.time() + timeout
+        self.log_stream_name = "bench/log/stream"
+        self.invoked_function_arn = function_arn
+        self.aws_request_id = "bench-request"
+
+    def get_remaining_time_in_millis(self):
+        return int(max(self.deadline - time.time(), 0) * 1000)
+
+
+def cfn_event(request_type, response_url, request_id = "bench-request", **properties):
+    event = {
+        "RequestType": request_type,
+        "ResponseURL": response_url,
+        "StackId": "arn:aws:cloudformation:us-west-2:123456789012:stack/bench/1",
+        "RequestId": request_id,
+        "LogicalResourceId": "InvokeLambdaFunction",
+        "ResourceType": "AWS::CloudFormation::CustomResource",
+        "ResourceProperties": properties
+    }
+    if request_type != "Create":
+        event["PhysicalResourceId"] = "d-1234567890"
+    return event
+
+
+def fake_credentials(env, url, services = ("workspaces", "lambda")):
+    # Environment for a process whose boto3 clients talk to the fake endpoint
+    env = dict(env)
+    env.update({
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_DEFAULT_REGION": "us-west-2"
+    })
+    for service in services:
+        env["AWS_ENDPOINT_URL_{}".format(service.upper())] = url
+    return env
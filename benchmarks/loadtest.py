@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+#
+# Offline load test for the directory registration Lambda (lambda/workspaceds.py).
+#
+# Replays synthetic Create/Update/Delete CloudFormation events at a given
+# concurrency. Every invocation runs in a worker process, like a Lambda sandbox,
+# against a local fake WorkSpaces endpoint that simulates directory registration
+# and WorkSpaces termination and injects latency and throttling. The same server
+# is the ResponseURL and follows re-invocation chains.
+#
+#   $ python3 benchmarks/loadtest.py --events 50 --concurrency 10 --throttle-rate 0.1
+#   $ python3 benchmarks/loadtest.py --register-seconds 60 --timeout 40 --callback-failure-rate 0.2
+#
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from fakeaws import FakeAWS, FakeContext, cfn_event, fake_credentials
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+
+class Directories(object):
+    # Just enough of WorkSpaces to register, tear down and deregister directories
+
+    def __init__(self, register_seconds, terminate_seconds):
+        self.register_seconds = register_seconds
+        self.terminate_seconds = terminate_seconds
+        self.lock = threading.Lock()
+        self.ready_at = {}
+        self.workspaces = {}
+
+    def seed(self, directory_id, workspaces):
+        # A directory that is registered already and has running WorkSpaces
+        self.ready_at[directory_id] = 0
+        self.workspaces[directory_id] = {
+            "ws-{}-{:03d}".format(directory_id[2:], i): None for i in range(workspaces)
+        }
+
+    def responses(self):
+        return {
+            "DescribeWorkspaceDirectories": self.describe_directories,
+            "RegisterWorkspaceDirectory": self.register,
+            "DescribeWorkspaces": self.describe_workspaces,
+            "TerminateWorkspaces": self.terminate,
+            "DeregisterWorkspaceDirectory": self.deregister
+        }
+
+    def describe_directories(self, request):
+        directory_id = request["DirectoryIds"][0]
+        with self.lock:
+            ready_at = self.ready_at.get(directory_id)
+        if ready_at is None:
+            return { "Directories": [] }
+        state = "REGISTERED" if time.time() >= ready_at else "REGISTERING"
+        return { "Directories": [ { "DirectoryId": directory_id, "State": state } ] }
+
+    def register(self, request):
+        with self.lock:
+            self.ready_at[request["DirectoryId"]] = time.time() + self.register_seconds
+            self.workspaces.setdefault(request["DirectoryId"], {})
+        return {}
+
+    def describe_workspaces(self, request):
+        now = time.time()
+        with self.lock:
+            workspaces = dict(self.workspaces.get(request["DirectoryId"], {}))
+        return { "Workspaces": [
+            { "WorkspaceId": ws, "State": "AVAILABLE" if gone is None else "TERMINATING" }
+            for ws, gone in sorted(workspaces.items()) if gone is None or now < gone
+        ] }
+
+    def terminate(self, request):
+        gone = time.time() + self.terminate_seconds
+        with self.lock:
+            for r in request["TerminateWorkspaceRequests"]:
+                for workspaces in self.workspaces.values():
+                    if workspaces.get(r["WorkspaceId"], gone) is None:
+                        workspaces[r["WorkspaceId"]] = gone
+        return { "FailedRequests": [] }
+
+    def deregister(self, request):
+        with self.lock:
+            self.ready_at.pop(request["DirectoryId"], None)
+        return {}
+
+
+def _init_worker(url):
+    os.environ.update(fake_credentials({}, url))
+    sys.path.insert(0, LAMBDA_DIR)
+
+
+def _invoke(event, timeout):
+    # One Lambda invocation; the function reads its directory from the environment
+    import workspaceds
+    os.environ["DIRECTORY_ID"] = event["ResourceProperties"]["DirectoryId"]
+    started = time.perf_counter()
+    try:
+        workspaceds.handler(event, FakeContext(timeout))
+    except Exception as e:
+        return event["RequestId"], time.perf_counter() - started, repr(e)
+    return event["RequestId"], time.perf_counter() - started, None
+
+
+def percentiles(values, points = (50, 95, 99)):
+    # Nearest-rank percentiles, None without samples
+    ordered = sorted(values)
+    if not ordered:
+        return { p: None for p in points }
+    return { p: ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in points }
+
+
+def parse_mix(value):
+    # "Create=6,Update=2,Delete=2" -> weights per request type
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ( "Create", "Update", "Delete" ):
+            raise argparse.ArgumentTypeError("unknown request type {}".format(kind))
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def run(args):
+    directories = Directories(args.register_seconds, args.terminate_seconds)
+    invocations = []
+    lock = threading.Lock()
+    pool = None
+
+    def submit(event):
+        try:
+            future = pool.submit(_invoke, event, args.timeout)
+        except RuntimeError:
+            return  # a continuation that arrives after the run has ended
+        with lock:
+            invocations.append(future)
+
+    fake = FakeAWS(
+        directories.responses(),
+        latency = args.latency,
+        throttle_rate = args.throttle_rate,
+        callback_latency = args.callback_latency,
+        callback_failure_rate = args.callback_failure_rate,
+        on_invoke = lambda event: submit(event)
+    ).start()
+
+    rng = random.Random(args.seed)
+    kinds = rng.choices(list(args.mix), weights = list(args.mix.values()), k = args.events)
+    events = []
+    for index, kind in enumerate(kinds):
+        directory_id = "d-load{:04d}".format(index)
+        if kind != "Create":
+            directories.seed(directory_id, args.workspaces)
+        event = cfn_event(kind, fake.url + "/cfn", request_id = "load-{:04d}".format(index), DirectoryId = directory_id)
+        if kind != "Create":
+            event["PhysicalResourceId"] = directory_id
+        events.append(event)
+
+    submitted = {}
+    started = time.time()
+    pool = ProcessPoolExecutor(max_workers = args.concurrency, initializer = _init_worker, initargs = (fake.url,))
+    try:
+        for event in events:
+            submitted[event["RequestId"]] = time.time()
+            submit(event)
+
+        # Wait until every event has a terminal response, continuations keep arriving meanwhile
+        while time.time() - started < args.deadline:
+            with fake.lock:
+                answered = { body["RequestId"] for _, body in fake.cfn_responses }
+            if len(answered) == len(events):
+                break
+            time.sleep(0.2)
+        wall = time.time() - started
+
+        # The invocations that sent the last responses are still returning
+        with lock:
+            pending = list(invocations)
+        wait(pending, timeout = args.timeout)
+    finally:
+        pool.shutdown(wait = False)
+        fake.stop()
+
+    with lock:
+        results = [ f.result() for f in invocations if f.done() and not f.cancelled() ]
+    with fake.lock:
+        responses = list(fake.cfn_responses)
+        attempts = fake.cfn_attempts
+        calls = Counter(operation for _, operation in fake.calls)
+
+    terminal = {}
+    delivered = Counter()
+    for at, body in responses:
+        delivered[body["RequestId"]] += 1
+        terminal.setdefault(body["RequestId"], (at, body["Status"]))
+
+    return {
+        "events": dict(Counter(kinds)),
+        "concurrency": args.concurrency,
+        "wall_seconds": wall,
+        "invocations": len(results),
+        "continuations": calls["Invoke"],
+        "handler_errors": [ error for _, _, error in results if error ],
+        "handler_ms": percentiles([ seconds * 1000 for _, seconds, _ in results ]),
+        "delivered": len(terminal),
+        "delivery_rate": len(terminal) / float(len(events)),
+        "missing": sorted(set(submitted) - set(terminal)),
+        "duplicates": sorted(r for r, n in delivered.items() if n > 1),
+        "put_attempts": attempts,
+        "status": dict(Counter(status for _, status in terminal.values())),
+        "terminal_seconds": percentiles([ at - submitted[r] for r, (at, _) in terminal.items() ]),
+        "api_calls": dict(calls)
+    }
+
+
+def report(result):
+    def row(name, values, unit, scale = "{:8.1f}"):
+        print("{:<18}".format(name) + "".join(
+            "  p{} ".format(p) + (scale.format(v) if v is not None else "       -") + " " + unit
+            for p, v in values.items()))
+
+    print("{:<18}{} ({}) at concurrency {}".format(
+        "events", sum(result["events"].values()),
+        ", ".join("{} {}".format(k, n) for k, n in sorted(result["events"].items())), result["concurrency"]))
+    print("{:<18}{} ({} continuations, {} raised)".format(
+        "invocations", result["invocations"], result["continuations"], len(result["handler_errors"])))
+    row("handler latency", result["handler_ms"], "ms")
+    print("{:<18}{}/{} delivered ({:.1%}), {} duplicate, {} PUT attempts".format(
+        "responses", result["delivered"], sum(result["events"].values()), result["delivery_rate"],
+        len(result["duplicates"]), result["put_attempts"]))
+    print("{:<18}{}".format("terminal status", ", ".join("{} {}".format(k, n) for k, n in sorted(result["status"].items()))))
+    row("time to terminal", result["terminal_seconds"], "s", "{:8.2f}")
+    print("{:<18}{}".format("API calls", ", ".join("{} {}".format(k, n) for k, n in sorted(result["api_calls"].items()))))
+    print("{:<18}{:.1f} s".format("wall time", result["wall_seconds"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Offline load test for lambda/workspaceds.py")
+    parser.add_argument("--events", type = int, default = 50)
+    parser.add_argument("--concurrency", type = int, default = 10, help = "invocations running at once")
+    parser.add_argument("--mix", type = parse_mix, default = "Create=6,Update=2,Delete=2")
+    parser.add_argument("--workspaces", type = int, default = 30, help = "WorkSpaces on a directory that is deleted")
+    parser.add_argument("--register-seconds", type = float, default = 5.0)
+    parser.add_argument("--terminate-seconds", type = float, default = 5.0)
+    parser.add_argument("--latency", type = float, default = 0.05, help = "mean WorkSpaces API latency in seconds")
+    parser.add_argument("--throttle-rate", type = float, default = 0.0, help = "share of API calls that are throttled")
+    parser.add_argument("--callback-latency", type = float, default = 0.0, help = "mean ResponseURL latency in seconds")
+    parser.add_argument("--callback-failure-rate", type = float, default = 0.0, help = "share of ResponseURL PUTs that fail")
+    parser.add_argument("--timeout", type = float, default = 120.0, help = "Lambda timeout in seconds")
+    parser.add_argument("--deadline", type = float, default = 600.0, help = "give up waiting after this many seconds")
+    parser.add_argument("--seed", type = int, default = 1)
+    parser.add_argument("--json", help = "also write the results to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    report(result)
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(result, fp, indent = 2)
+
+    # Every stack must get exactly one response, CloudFormation hangs or errors otherwise
+    sys.exit(1 if result["missing"] or result["duplicates"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#
+# Synth-time benchmark for fleet mode: how template count and size grow with the
+# number of WorkSpaces in the user manifest. Builds every stack app.py builds.
+#
+#   $ python3 benchmarks/synth_fleet.py 1 100 500 1000
+#
+
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aws_cdk import core
+
+from WorkSpaces.landscape import build
+
+
+# Placeholder values so the app synthesizes offline, lookups fall back to dummy values
+BENCH_CONTEXT = {
+    "Account": "123456789012",
+    "Region": "us-west-2",
+    "Domain_name": "bench.lab",
+    "Secret_domain_password_arn": "arn:aws:secretsmanager:us-west-2:123456789012:secret:bench-pw",
+    "Instance_type": "t3.medium",
+    "VpcId": "vpc-12345",
+    "Subnet1": [ "subnet-11111", "us-west-2a" ],
+    "Subnet2": [ "subnet-22222", "us-west-2b" ],
+    "Secret_keypair_arn": "arn:aws:secretsmanager:us-west-2:123456789012:secret:bench-key",
+    "WorkSpacesBundle": "wsb-8vbljg4r6",
+    "SAPGUIBundle": { "version": "7.70", "builder_workspace_id": "ws-bench" },
+    "WorkSpacesPrewarm": [
+        { "name": "bench", "shift_start": "08:00", "timezone": "Europe/Berlin", "days": "MON-FRI",
+          "lead_minutes": 30, "ramp_minutes": 10, "tags": { "Wave": "bench" } }
+    ],
+    "WorkSpacesMonitoring": { "schedule_minutes": 5 },
+    "WorkSpacesInventory": { "reconcile_minutes": 60 }
+}
+
+
+def write_manifest(path, size):
+    with open(path, "w", newline = "") as fp:
+        writer = csv.writer(fp)
+        writer.writerow([ "user", "bundle", "compute_type", "tags" ])
+        for i in range(size):
+            writer.writerow([ "bench\\user{:05d}".format(i), "", "STANDARD", "Wave=bench;Index={}".format(i) ])
+
+
+def synth(size, workdir, extra_context = None, environments = 1):
+    manifest = os.path.join(workdir, "manifest-{}.csv".format(size))
+    write_manifest(manifest, size)
+
+    context = dict(BENCH_CONTEXT, WorkSpacesManifest = manifest, **(extra_context or {}))
+    outdir = os.path.join(workdir, "cdk.out-{}-{}".format(size, environments))
+
+    started = time.perf_counter()
+    app = core.App(context = context, outdir = outdir)
+    for index in range(environments):
+        # One landscape per environment, each in its own account
+        prefix = "Env{}-".format(index) if environments > 1 else ""
+        env = core.Environment(account = str(int(context["Account"]) + index), region = context["Region"])
+        build(app, env, prefix)
+    app.synth()
+    elapsed = time.perf_counter() - started
+
+    templates = [
+        os.path.join(outdir, name) for name in os.listdir(outdir)
+        if name.endswith(".template.json")
+    ]
+    sizes = [ os.path.getsize(t) for t in templates ]
+    resources = 0
+    for template in templates:
+        with open(template) as fp:
+            resources += len(json.load(fp).get("Resources", {}))
+    return {
+        "workspaces": size,
+        "environments": environments,
+        "templates": len(templates),
+        "resources": resources,
+        "total_bytes": sum(sizes),
+        "largest_bytes": max(sizes),
+        "synth_seconds": elapsed
+    }
+
+
+def main(argv):
+    sizes = [ int(a) for a in argv ] or [ 1, 100, 250, 500, 1000 ]
+    with tempfile.TemporaryDirectory() as workdir:
+        print("{:>10} {:>10} {:>12} {:>14} {:>10}".format(
+            "WorkSpaces", "Templates", "Total bytes", "Largest bytes", "Synth s"))
+        for size in sizes:
+            r = synth(size, workdir)
+            print("{workspaces:>10} {templates:>10} {total_bytes:>12} {largest_bytes:>14} {synth_seconds:>10.2f}".format(**r))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,91 @@
+#
+# Synth performance suite for the CDK app. Every case (fleet size x number of
+# environments) is synthesized offline in a fresh interpreter. The suite records
+# wall time, peak memory, template bytes and resource count, and fails a case
+# that regressed against the stored baseline.
+#
+#   $ pytest benchmarks                                 # compare with the baseline
+#   $ pytest benchmarks --update-baseline               # store the current results
+#   $ pytest benchmarks --sizes 1 500 --environments 1 3
+#
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BENCH_DIR
+
+pytest.importorskip("aws_cdk.core")
+
+# Allowed growth over the baseline before a metric counts as a regression
+TOLERANCE = {
+    "synth_seconds": 0.25,
+    "peak_rss_kb": 0.20,
+    "total_bytes": 0.05,
+    "resources": 0.0
+}
+
+# Synthesis runs in the jsii node process this interpreter starts, which is still
+# alive when synth returns, so its peak RSS is read from /proc while it runs
+CHILD = """
+import json, os, resource, sys
+sys.path.insert(0, {bench!r})
+from synth_fleet import synth
+
+def peak_kb(pid):
+    try:
+        with open("/proc/{{}}/status".format(pid)) as fp:
+            return next(int(line.split()[1]) for line in fp if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return 0
+
+def children():
+    pids = []
+    for name in os.listdir("/proc"):
+        try:
+            with open("/proc/{{}}/stat".format(name)) as fp:
+                if int(fp.read().rsplit(")", 1)[1].split()[1]) == os.getpid():
+                    pids.append(name)
+        except (OSError, ValueError, IndexError):
+            pass
+    return pids
+
+result = synth({size}, {workdir!r}, environments = {environments})
+if os.path.isdir("/proc"):
+    result["peak_rss_kb"] = peak_kb("self") + sum(peak_kb(pid) for pid in children())
+else:
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps(result))
+"""
+
+
+def run_case(size, environments, workdir):
+    out = subprocess.run(
+        [ sys.executable, "-c", CHILD.format(bench = BENCH_DIR, size = size, workdir = workdir, environments = environments) ],
+        check = True, stdout = subprocess.PIPE
+    ).stdout.decode()
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def regressions(result, base):
+    """(metric, baseline, current) for every metric that grew beyond its tolerance."""
+    return [
+        ( metric, base[metric], result[metric] )
+        for metric, tolerance in TOLERANCE.items()
+        if metric in base and result[metric] > base[metric] * (1 + tolerance)
+    ]
+
+
+def test_synth(size, environments, tmp_path, baseline, record, pytestconfig):
+    result = run_case(size, environments, str(tmp_path))
+    record(result)
+
+    assert result["templates"] >= environments
+    if pytestconfig.getoption("update_baseline"):
+        return
+    base = baseline.get("{}x{}".format(size, environments))
+    if not base:
+        pytest.skip("no baseline for {} WorkSpaces x {} environments".format(size, environments))
+    assert not regressions(result, base)
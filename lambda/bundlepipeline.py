@@ -0,0 +1,151 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import logging
+import time
+import cfnresponse
+import continuation
+from clients import client
+
+# Hand off to a new invocation when less than this many seconds are left
+HANDOFF_SECONDS = 30
+
+# Tag that records the SAP GUI version on images and bundles
+VERSION_TAG = 'SAPGUIVersion'
+
+# SSM parameter per version, written by the function so it outlives the custom resource
+PARAMETER_PREFIX = '/sapgui/bundle/'
+
+
+def image_name(version):
+    return 'sapgui-{}'.format(version)
+
+
+def find_bundle(name):
+    # Without BundleIds or Owner, only bundles owned by this account are listed
+    paginator = client('workspaces').get_paginator('describe_workspace_bundles')
+    for page in paginator.paginate():
+        for bundle in page['Bundles']:
+            if bundle['Name'] == name:
+                return bundle
+    return None
+
+
+def find_image(name):
+    kwargs = {'ImageType': 'OWNED'}
+    while True:
+        page = client('workspaces').describe_workspace_images(**kwargs)
+        for image in page['Images']:
+            if image['Name'] == name:
+                return image
+        if not page.get('NextToken'):
+            return None
+        kwargs['NextToken'] = page['NextToken']
+
+
+def wait_until_available(name, context, interval = 30.0, max_interval = 120.0):
+    # Poll the image until it is AVAILABLE, None if the deadline comes first
+    while True:
+        # A new image may not be listed yet right after CreateWorkspaceImage
+        image = find_image(name) or {'State': 'PENDING'}
+        if image['State'] == 'AVAILABLE':
+            return image
+        if image['State'] == 'ERROR':
+            raise Exception("Image {} failed: {}".format(name, image.get('ErrorMessage')))
+        if continuation.remaining_seconds(context) - interval < HANDOFF_SECONDS:
+            return None
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+
+
+def build(props, context):
+    """Capture the builder WorkSpace as an image and create a bundle from it.
+
+    Every step is looked up by name first, so a re-invocation or a re-run for
+    the same version picks up where the last one stopped. Returns None while
+    the image is still being created.
+    """
+    name = image_name(props['Version'])
+    tags = [{'Key': VERSION_TAG, 'Value': props['Version']}]
+
+    bundle = find_bundle(name)
+    if bundle:
+        return bundle
+
+    if find_image(name) is None:
+        client('workspaces').create_workspace_image(
+            Name = name,
+            Description = 'SAP GUI {} with SSO configuration'.format(props['Version']),
+            WorkspaceId = props['BuilderWorkspaceId'],
+            Tags = tags
+        )
+
+    image = wait_until_available(name, context)
+    if image is None:
+        return None
+
+    return client('workspaces').create_workspace_bundle(
+        BundleName = name,
+        BundleDescription = 'SAP GUI {} with SSO configuration'.format(props['Version']),
+        ImageId = image['ImageId'],
+        ComputeType = {'Name': props['ComputeType']},
+        RootStorage = {'Capacity': str(props['RootVolumeSizeGib'])},
+        UserStorage = {'Capacity': str(props['UserVolumeSizeGib'])},
+        Tags = tags
+    )['WorkspaceBundle']
+
+
+def record_version(version, bundle_id):
+    # One parameter per version, kept when the next version replaces the custom resource
+    client('ssm').put_parameter(
+        Name = PARAMETER_PREFIX + version,
+        Description = 'WorkSpaces bundle with SAP GUI {}'.format(version),
+        Value = bundle_id,
+        Type = 'String',
+        Overwrite = True
+    )
+
+
+def handler(event, context):
+
+    data = {}
+    physical_id = event.get('PhysicalResourceId')
+    with cfnresponse.Watchdog(event, context) as watchdog:
+        status = cfnresponse.SUCCESS
+        try:
+            # Bundles of earlier versions are kept on Delete so WorkSpaces can roll back to them
+            if event['RequestType'] != 'Delete':
+                if continuation.expired(event):
+                    raise Exception("Image for SAP GUI {} was not ready in time".format(
+                        event['ResourceProperties']['Version']))
+                bundle = build(event['ResourceProperties'], context)
+                if bundle is None:
+                    watchdog.cancel()
+                    continuation.continue_later(event, context)
+                    return
+                record_version(event['ResourceProperties']['Version'], bundle['BundleId'])
+                physical_id = bundle['BundleId']
+                data = {'BundleId': bundle['BundleId'], 'ImageId': bundle['ImageId']}
+
+        except Exception as e:
+            logging.error('Exception: %s' % e, exc_info=True)
+            data['Error'] = str(e)
+            status = cfnresponse.FAILED
+
+        if not cfnresponse.send(event, context, status, data, physical_id):
+            logging.error('Could not deliver %s to CloudFormation for request %s', status, event['RequestId'])
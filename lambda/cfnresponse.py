@@ -5,15 +5,74 @@
 #  This file is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied.
 #  See the License for the specific language governing permissions and limitations under the License.
 
-from botocore.vendored import requests
 import json
+import logging
+import threading
+
+import urllib3
+
+import tracing
 
 SUCCESS = "SUCCESS"
 FAILED = "FAILED"
 
-def send(event, context, responseStatus, responseData, physicalResourceId=None, noEcho=False):
+# Strict timeouts so a hanging PUT cannot hold the Lambda until its deadline
+CONNECT_TIMEOUT = 3.0
+READ_TIMEOUT = 10.0
+RETRIES = 4
+BACKOFF_FACTOR = 0.5
+
+# Send FAILED this long before the Lambda deadline if no response was sent yet
+WATCHDOG_MARGIN_MS = 5000
+
+_http = None
+_lock = threading.Lock()
+_sent = set()
+
+
+def _retry():
+    # urllib3 2.x renamed method_whitelist to allowed_methods
+    methods = frozenset(['PUT'])
+    options = dict(total=RETRIES, backoff_factor=BACKOFF_FACTOR,
+                   status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    if hasattr(urllib3.util.Retry, 'DEFAULT_ALLOWED_METHODS'):
+        options['allowed_methods'] = methods
+    else:
+        options['method_whitelist'] = methods
+    return urllib3.util.Retry(**options)
+
+
+def http():
+    # One pooled client per container, reused across warm invocations
+    global _http
+    if _http is None:
+        _http = urllib3.PoolManager(
+            num_pools=2,
+            maxsize=2,
+            timeout=urllib3.util.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+            retries=_retry()
+        )
+    return _http
+
+
+def _claim(requestId):
+    # Only the first response for a request is sent, the handler and watchdog may race
+    with _lock:
+        if requestId in _sent:
+            return False
+        _sent.add(requestId)
+        return True
+
+
+def send(event, context, responseStatus, responseData, physicalResourceId=None, noEcho=False,
+         timeout=None, retries=None):
+    # timeout and retries override the pool defaults for this PUT, e.g. close to the deadline
     responseUrl = event['ResponseURL']
 
+    if not _claim(event['RequestId']):
+        print("Response for request " + event['RequestId'] + " was already sent")
+        return False
+
     print(responseUrl)
 
     responseBody = {}
@@ -35,10 +94,62 @@ def send(event, context, responseStatus, responseData, physicalResourceId=None,
         'content-length' : str(len(json_responseBody))
     }
 
+    options = {}
+    if timeout is not None:
+        options['timeout'] = timeout
+    if retries is not None:
+        options['retries'] = retries
+
     try:
-        response = requests.put(responseUrl,
-                                data=json_responseBody,
-                                headers=headers)
-        print("Status code: " + response.reason)
+        with tracing.timed('cfn_response', request_id=event['RequestId'], response_status=responseStatus) as record:
+            response = http().request('PUT', responseUrl,
+                                      body=json_responseBody.encode('utf-8'),
+                                      headers=headers, **options)
+            record['status'] = response.status
+            history = getattr(response, 'retries', None)
+            record['retries'] = len(history.history) if history else 0
+        print("Status code: " + str(response.status))
+        return 200 <= response.status < 300
     except Exception as e:
-        print("send(..) failed executing requests.put(..): " + str(e))
+        print("send(..) failed executing PUT: " + str(e))
+        return False
+
+
+class Watchdog(object):
+    """Send FAILED shortly before the Lambda deadline unless a response was sent.
+
+        with cfnresponse.Watchdog(event, context):
+            ...
+            cfnresponse.send(event, context, cfnresponse.SUCCESS, {})
+    """
+
+    def __init__(self, event, context, margin_ms=WATCHDOG_MARGIN_MS):
+        self.event = event
+        self.context = context
+        self.margin_ms = margin_ms
+        self.timer = None
+
+    def _expire(self):
+        print("Watchdog: Lambda deadline is near, sending FAILED")
+        # One attempt that has to finish before the deadline, the pool default could outlast it
+        budget = max(self.context.get_remaining_time_in_millis() / 1000.0 - 1.0, 0.5)
+        if not send(self.event, self.context, FAILED, {'Reason': 'Timed out'},
+                    timeout=urllib3.util.Timeout(total=budget), retries=False):
+            logging.error("Watchdog could not deliver FAILED for request %s", self.event['RequestId'])
+
+    def __enter__(self):
+        delay = (self.context.get_remaining_time_in_millis() - self.margin_ms) / 1000.0
+        self.timer = threading.Timer(max(delay, 0), self._expire)
+        self.timer.daemon = True
+        self.timer.start()
+        return self
+
+    def cancel(self):
+        # Disarm, e.g. when handing the request off to another invocation
+        self.timer.cancel()
+
+    def __exit__(self, *exc):
+        self.cancel()
+        with _lock:
+            _sent.discard(self.event['RequestId'])
+        return False
@@ -0,0 +1,60 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import os
+import threading
+
+import tracing
+
+# boto3 is imported and clients are created on first use, then cached for
+# the lifetime of the container so warm invocations reuse them.
+_clients = {}
+_lock = threading.Lock()
+
+
+def endpoint_url(service_name):
+    # AWS_ENDPOINT_URL_<SERVICE> or AWS_ENDPOINT_URL, e.g. for DynamoDB Local. The
+    # pinned botocore predates reading these itself, so they are passed explicitly.
+    key = 'AWS_ENDPOINT_URL_' + service_name.upper().replace('-', '_')
+    return os.environ.get(key) or os.environ.get('AWS_ENDPOINT_URL') or None
+
+
+def client(service_name):
+    cached = _clients.get(service_name)
+    if cached is None:
+        # Creating clients from the default session is not thread safe
+        with _lock:
+            cached = _clients.get(service_name)
+            if cached is None:
+                import boto3
+                cached = _clients[service_name] = tracing.instrument(
+                    boto3.client(service_name, endpoint_url=endpoint_url(service_name)))
+    return cached
+
+
+def resource(service_name):
+    key = ('resource', service_name)
+    cached = _clients.get(key)
+    if cached is None:
+        with _lock:
+            cached = _clients.get(key)
+            if cached is None:
+                import boto3
+                cached = _clients[key] = boto3.resource(service_name, endpoint_url=endpoint_url(service_name))
+                tracing.instrument(cached.meta.client)
+    return cached
@@ -0,0 +1,59 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import time
+
+from clients import client
+
+# Key in the event that carries the state of a re-invocation chain
+CONTINUATION_KEY = 'Continuation'
+
+# CloudFormation waits one hour for a custom resource, give up a bit earlier
+CHAIN_LIMIT_SECONDS = 55 * 60
+
+
+def remaining_seconds(context):
+    return context.get_remaining_time_in_millis() / 1000.0
+
+
+def state(event):
+    # The continuation state, starting a new chain on the first invocation
+    current = event.get(CONTINUATION_KEY)
+    if current is None:
+        current = {'Started': time.time(), 'Invocation': 0}
+    return current
+
+
+def expired(event):
+    return time.time() - state(event)['Started'] > CHAIN_LIMIT_SECONDS
+
+
+def continue_later(event, context, **values):
+    """Re-invoke this function asynchronously with the same event and updated state."""
+    current = dict(state(event), **values)
+    current['Invocation'] += 1
+    payload = dict(event)
+    payload[CONTINUATION_KEY] = current
+
+    client('lambda').invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(payload).encode('utf-8')
+    )
+    print("Continuing in invocation {}".format(current['Invocation']))
@@ -0,0 +1,88 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import logging
+import time
+import cfnresponse
+import continuation
+from clients import client
+
+# Hand off to a new invocation when less than this many seconds are left
+HANDOFF_SECONDS = 30
+
+
+def domain_controllers(directory_id):
+    controllers = []
+    paginator = client('ds').get_paginator('describe_domain_controllers')
+    for page in paginator.paginate(DirectoryId = directory_id):
+        controllers.extend(page['DomainControllers'])
+    return controllers
+
+
+def active_ips(controllers):
+    return sorted(dc['DnsIpAddr'] for dc in controllers if dc['Status'] == 'Active')
+
+
+def wait_until_active(directory_id, desired, context, interval = 15.0, max_interval = 60.0):
+    # Poll until exactly the desired number of DCs is Active, None if the deadline comes first
+    while True:
+        controllers = domain_controllers(directory_id)
+        ips = active_ips(controllers)
+        if len(ips) == desired and len(controllers) == desired:
+            return ips
+        failed = [ dc['DomainControllerId'] for dc in controllers if dc['Status'] == 'Failed' ]
+        if failed:
+            raise Exception("Domain controllers failed: {}".format(", ".join(failed)))
+        if continuation.remaining_seconds(context) - interval < HANDOFF_SECONDS:
+            return None
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+
+
+def handler(event, context):
+
+    props = event['ResourceProperties']
+    directory_id = props['DirectoryId']
+    desired = int(props['DesiredNumber'])
+    data = {}
+    with cfnresponse.Watchdog(event, context) as watchdog:
+        status = cfnresponse.SUCCESS
+        try:
+            if event['RequestType'] != 'Delete':
+                if continuation.CONTINUATION_KEY not in event and len(domain_controllers(directory_id)) != desired:
+                    client('ds').update_number_of_domain_controllers(
+                        DirectoryId = directory_id,
+                        DesiredNumber = desired
+                    )
+                if continuation.expired(event):
+                    raise Exception("Domain controllers of {} did not become active in time".format(directory_id))
+                ips = wait_until_active(directory_id, desired, context)
+                if ips is None:
+                    watchdog.cancel()
+                    continuation.continue_later(event, context)
+                    return
+                data['DnsIpAddrs'] = ",".join(ips)
+
+        except Exception as e:
+            logging.error('Exception: %s' % e, exc_info=True)
+            data['Error'] = str(e)
+            status = cfnresponse.FAILED
+
+        physical_id = event.get('PhysicalResourceId', directory_id)
+        if not cfnresponse.send(event, context, status, data, physical_id):
+            logging.error('Could not deliver %s to CloudFormation for request %s', status, event['RequestId'])
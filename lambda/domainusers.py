@@ -0,0 +1,180 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import logging
+import time
+import cfnresponse
+import continuation
+from clients import client
+
+# Hand off to a new invocation when less than this many seconds are left
+HANDOFF_SECONDS = 30
+
+# Run Command states that end a command invocation
+DONE_STATES = ('Success', 'Cancelled', 'TimedOut', 'Failed')
+
+# States a reboot of the instance can leave a command in
+RESEND_STATES = ('TimedOut', 'Failed')
+
+SCRIPT = """
+$ErrorActionPreference = 'Stop'
+Install-WindowsFeature RSAT-AD-PowerShell | Out-Null
+Import-Module ActiveDirectory
+Add-Type -AssemblyName System.Web
+
+$domain = '{domain}'
+$secret = (Get-SECSecretValue -SecretId '{secret}').SecretString | ConvertFrom-Json
+$password = ConvertTo-SecureString $secret.Key -AsPlainText -Force
+$credential = New-Object System.Management.Automation.PSCredential("$domain\\{admin}", $password)
+
+# AWS Managed Microsoft AD delegates the Users OU below the NetBIOS OU
+$ad = Get-ADDomain -Server $domain -Credential $credential
+$path = "OU=Users,OU=$($ad.NetBIOSName),$($ad.DistinguishedName)"
+
+$users = '{users}' | ConvertFrom-Json
+foreach ($u in $users) {{
+    $sam = $u.SamAccountName
+    if (Get-ADUser -Filter "SamAccountName -eq '$sam'" -Server $domain -Credential $credential) {{
+        Write-Host "Exists $sam"
+        continue
+    }}
+    # Store the initial password before the user exists, a re-run overwrites it for a user not created yet
+    $plain = [System.Web.Security.Membership]::GeneratePassword(24, 4)
+    $name = '{prefix}' + $sam
+    try {{
+        New-SECSecret -Name $name -SecretString $plain -Description "Initial password of $sam@$domain" | Out-Null
+    }} catch [Amazon.SecretsManager.Model.ResourceExistsException] {{
+        Write-SECSecretValue -SecretId $name -SecretString $plain | Out-Null
+    }}
+    $initial = ConvertTo-SecureString $plain -AsPlainText -Force
+    New-ADUser -Server $domain -Credential $credential -Path $path `
+        -Name $sam -SamAccountName $sam -UserPrincipalName "$sam@$domain" `
+        -GivenName $u.GivenName -Surname $u.Surname -EmailAddress $u.EmailAddress `
+        -AccountPassword $initial -ChangePasswordAtLogon $true -Enabled $true
+    Write-Host "Created $sam, initial password in secret $name"
+}}
+"""
+
+
+def script(props):
+    # Users are passed as JSON in a single-quoted PowerShell string
+    users = json.dumps(props['Users']).replace("'", "''")
+    return SCRIPT.format(
+        domain = props['DomainName'],
+        secret = props['PasswordSecretArn'],
+        admin = props['AdminUser'],
+        prefix = props['InitialPasswordPrefix'],
+        users = users
+    )
+
+
+def joined(instance_id, domain, association_id = None):
+    """True once the join association succeeded and the instance is back online as a domain member.
+
+    The association runs Add-Computer and then reboots, so Online alone can
+    mean the instance is about to go down. The computer name only carries the
+    domain after that reboot.
+    """
+    if association_id:
+        statuses = client('ssm').describe_instance_associations_status(
+            InstanceId = instance_id
+        )['InstanceAssociationStatusInfos']
+        status = next((s['Status'] for s in statuses if s['AssociationId'] == association_id), None)
+        if status == 'Failed':
+            raise Exception("Joining {} to {} failed".format(instance_id, domain))
+        if status != 'Success':
+            return False
+
+    info = client('ssm').describe_instance_information(
+        Filters = [ { 'Key': 'InstanceIds', 'Values': [ instance_id ] } ]
+    )['InstanceInformationList']
+    return bool(info) and info[0]['PingStatus'] == 'Online' and \
+        info[0].get('ComputerName', '').lower().endswith('.' + domain.lower())
+
+
+def command_status(command_id, instance_id):
+    try:
+        return client('ssm').get_command_invocation(
+            CommandId = command_id,
+            InstanceId = instance_id
+        )
+    except client('ssm').exceptions.InvocationDoesNotExist:
+        return { 'Status': 'Pending' }
+
+
+def run(event, context, interval = 10.0, max_interval = 30.0):
+    """Run the user creation script on the admin instance, returns the invocation or None to continue later."""
+    props = event['ResourceProperties']
+    instance_id = props['InstanceId']
+    command_id = continuation.state(event).get('CommandId')
+    resent = continuation.state(event).get('Resent', False)
+
+    while True:
+        if command_id is None and joined(instance_id, props['DomainName'], props.get('JoinAssociationId')):
+            command_id = client('ssm').send_command(
+                InstanceIds = [ instance_id ],
+                DocumentName = 'AWS-RunPowerShellScript',
+                Comment = 'Create WorkSpaces domain users',
+                Parameters = { 'commands': [ script(props) ] }
+            )['Command']['CommandId']
+
+        if command_id is not None:
+            invocation = command_status(command_id, instance_id)
+            if invocation['Status'] in RESEND_STATES and not resent:
+                # A late reboot can kill the script, send it once more, it skips existing users
+                logging.warning('Command %s ended %s, sending it again', command_id, invocation['Status'])
+                command_id = None
+                resent = True
+            elif invocation['Status'] in DONE_STATES:
+                return invocation
+
+        if continuation.remaining_seconds(context) - interval < HANDOFF_SECONDS:
+            continuation.continue_later(event, context, CommandId = command_id, Resent = resent)
+            return None
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+
+
+def handler(event, context):
+
+    data = {}
+    with cfnresponse.Watchdog(event, context) as watchdog:
+        status = cfnresponse.SUCCESS
+        try:
+            # Users are kept on Delete, they may own WorkSpaces and data
+            if event['RequestType'] != 'Delete':
+                if continuation.expired(event):
+                    raise Exception("Domain users were not created in time")
+                invocation = run(event, context)
+                if invocation is None:
+                    watchdog.cancel()
+                    return
+                print(invocation.get('StandardOutputContent'))
+                if invocation['Status'] != 'Success':
+                    raise Exception("Creating domain users {}: {}".format(
+                        invocation['Status'], invocation.get('StandardErrorContent')))
+                data['Users'] = str(len(event['ResourceProperties']['Users']))
+
+        except Exception as e:
+            logging.error('Exception: %s' % e, exc_info=True)
+            data['Error'] = str(e)
+            status = cfnresponse.FAILED
+
+        if not cfnresponse.send(event, context, status, data, event.get('PhysicalResourceId', 'DomainUsers')):
+            logging.error('Could not deliver %s to CloudFormation for request %s', status, event['RequestId'])
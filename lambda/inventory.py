@@ -0,0 +1,191 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import os
+import time
+
+from clients import client, resource
+from retry import chunks
+
+# DescribeWorkspaces accepts at most 25 WorkspaceIds per call
+MAX_BATCH = 25
+
+# Global secondary indexes of the inventory table
+USER_INDEX = 'ByUser'
+BUNDLE_INDEX = 'ByBundle'
+STATE_INDEX = 'ByState'
+
+# States a WorkSpace passes through, the item is checked again until it leaves them
+TRANSIENT_STATES = ('PENDING', 'STARTING', 'STOPPING', 'REBOOTING', 'REBUILDING', 'RESTORING',
+                    'MAINTENANCE', 'ADMIN_MAINTENANCE', 'UPDATING', 'TERMINATING')
+
+# Keys in CloudTrail request parameters and response elements that name a WorkSpace
+ID_KEYS = ('workspaceId', 'sourceWorkspaceId', 'targetWorkspaceId')
+
+
+def table():
+    return resource('dynamodb').Table(os.environ['INVENTORY_TABLE'])
+
+
+def item(ws):
+    # The indexed attributes and the ones operations ask about
+    props = ws.get('WorkspaceProperties', {})
+    entry = {
+        'WorkspaceId': ws['WorkspaceId'],
+        'DirectoryId': ws['DirectoryId'],
+        'UserName': ws['UserName'].lower(),
+        'BundleId': ws['BundleId'],
+        'State': ws['State'],
+        'ComputeType': props.get('ComputeTypeName'),
+        'RunningMode': props.get('RunningMode'),
+        'ComputerName': ws.get('ComputerName'),
+        'IpAddress': ws.get('IpAddress')
+    }
+    return { k: v for k, v in entry.items() if v }
+
+
+def describe(ids):
+    found = {}
+    for batch in chunks(sorted(ids), MAX_BATCH):
+        for ws in client('workspaces').describe_workspaces(WorkspaceIds = batch)['Workspaces']:
+            found[ws['WorkspaceId']] = ws
+    return found
+
+
+def _ids(value):
+    # All WorkSpace IDs anywhere in a CloudTrail request or response
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key in ID_KEYS and isinstance(child, str):
+                yield child
+            else:
+                yield from _ids(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _ids(child)
+
+
+def apply(inventory, ids, found):
+    # Upsert what still exists, drop what is gone or terminated
+    with inventory.batch_writer(overwrite_by_pkeys = [ 'WorkspaceId' ]) as batch:
+        for workspace_id in ids:
+            ws = found.get(workspace_id)
+            if ws is None or ws['State'] == 'TERMINATED':
+                batch.delete_item(Key = { 'WorkspaceId': workspace_id })
+            else:
+                batch.put_item(Item = dict(item(ws), UpdatedAt = int(time.time())))
+
+
+def event_handler(event, context):
+    """Apply one WorkSpaces API call from EventBridge (via CloudTrail) to the inventory."""
+    detail = event.get('detail', {})
+    ids = set(_ids(detail.get('requestParameters'))) | set(_ids(detail.get('responseElements')))
+    if ids:
+        found = describe(ids)
+        # Only the directory reconcile keeps, the event rule sees calls for every directory
+        directory_id = os.environ.get('DIRECTORY_ID')
+        if directory_id:
+            ids -= { i for i, ws in found.items() if ws['DirectoryId'] != directory_id }
+        if ids:
+            apply(table(), ids, found)
+    print(json.dumps({ 'EventName': detail.get('eventName'), 'Updated': len(ids) }))
+
+
+def recheck(inventory):
+    """Describe the WorkSpaces stored in a transient state again and apply their current state."""
+    ids = { entry['WorkspaceId'] for state in TRANSIENT_STATES for entry in by_state(inventory, state) }
+    if ids:
+        apply(inventory, ids, describe(ids))
+    return { 'Rechecked': len(ids) }
+
+
+def recheck_handler(event, context):
+    report = recheck(table())
+    print(json.dumps(report))
+    return report
+
+
+def reconcile(inventory, directory_id = None):
+    """Compare a full scan of the WorkSpaces with the table and write only the differences."""
+    current = {}
+    kwargs = { 'DirectoryId': directory_id } if directory_id else {}
+    for page in client('workspaces').get_paginator('describe_workspaces').paginate(**kwargs):
+        for ws in page['Workspaces']:
+            if ws['State'] != 'TERMINATED':
+                current[ws['WorkspaceId']] = item(ws)
+
+    stored = {}
+    for entry in _paginate(inventory.scan):
+        entry.pop('UpdatedAt', None)
+        stored[entry['WorkspaceId']] = entry
+
+    if directory_id:
+        stored = { k: v for k, v in stored.items() if v.get('DirectoryId') == directory_id }
+
+    changed = [ k for k, v in current.items() if stored.get(k) != v ]
+    removed = [ k for k in stored if k not in current ]
+    now = int(time.time())
+    with inventory.batch_writer(overwrite_by_pkeys = [ 'WorkspaceId' ]) as batch:
+        for workspace_id in changed:
+            batch.put_item(Item = dict(current[workspace_id], UpdatedAt = now))
+        for workspace_id in removed:
+            batch.delete_item(Key = { 'WorkspaceId': workspace_id })
+    return { 'Scanned': len(current), 'Changed': len(changed), 'Removed': len(removed) }
+
+
+def reconcile_handler(event, context):
+    report = reconcile(table(), os.environ.get('DIRECTORY_ID'))
+    print(json.dumps(report))
+    return report
+
+
+def _paginate(operation, **kwargs):
+    while True:
+        page = operation(**kwargs)
+        yield from page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def _query(inventory, index, attribute, value):
+    from boto3.dynamodb.conditions import Key
+    return list(_paginate(
+        inventory.query,
+        IndexName = index,
+        KeyConditionExpression = Key(attribute).eq(value)
+    ))
+
+
+# Query API for other tools, instead of scanning DescribeWorkspaces
+
+def get(inventory, workspace_id):
+    return inventory.get_item(Key = { 'WorkspaceId': workspace_id }).get('Item')
+
+
+def by_user(inventory, user_name):
+    return _query(inventory, USER_INDEX, 'UserName', user_name.split('\\')[-1].lower())
+
+
+def by_bundle(inventory, bundle_id):
+    return _query(inventory, BUNDLE_INDEX, 'BundleId', bundle_id)
+
+
+def by_state(inventory, state):
+    return _query(inventory, STATE_INDEX, 'State', state)
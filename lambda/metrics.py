@@ -0,0 +1,143 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from clients import client
+
+# CloudWatch namespace of the collected metrics
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'WorkSpaces/SAPGUI')
+
+# EMF allows up to 100 values per metric in one log event
+MAX_VALUES = 100
+
+
+def workspaces(directory_id):
+    result = []
+    paginator = client('workspaces').get_paginator('describe_workspaces')
+    for page in paginator.paginate(DirectoryId = directory_id):
+        result.extend(page['Workspaces'])
+    return result
+
+
+def connection_status():
+    # DescribeWorkspacesConnectionStatus has no paginator, follow NextToken
+    result = []
+    kwargs = {}
+    while True:
+        page = client('workspaces').describe_workspaces_connection_status(**kwargs)
+        result.extend(page['WorkspacesConnectionStatus'])
+        if not page.get('NextToken'):
+            return result
+        kwargs['NextToken'] = page['NextToken']
+
+
+def start_times(since):
+    # When each WorkSpace was last started, from StartWorkspaces calls in CloudTrail
+    started = {}
+    paginator = client('cloudtrail').get_paginator('lookup_events')
+    pages = paginator.paginate(
+        LookupAttributes = [ { 'AttributeKey': 'EventName', 'AttributeValue': 'StartWorkspaces' } ],
+        StartTime = since
+    )
+    for page in pages:
+        for event in page['Events']:
+            detail = json.loads(event['CloudTrailEvent'])
+            for request in (detail.get('requestParameters') or {}).get('startWorkspaceRequests', []):
+                workspace_id = request.get('workspaceId')
+                if workspace_id and event['EventTime'] > started.get(workspace_id, since):
+                    started[workspace_id] = event['EventTime']
+    return started
+
+
+def _sample(values):
+    # Keep the EMF document within the per-metric value limit
+    if len(values) <= MAX_VALUES:
+        return values
+    values = sorted(values)
+    step = len(values) / float(MAX_VALUES)
+    return [ values[int(i * step)] for i in range(MAX_VALUES) ]
+
+
+def collect(directory_id, now, period):
+    """Metrics for one EMF document: state counts and latency distributions."""
+    with ThreadPoolExecutor(max_workers = 3) as pool:
+        described = pool.submit(workspaces, directory_id)
+        connections = pool.submit(connection_status)
+        starts = pool.submit(start_times, now - period)
+        described, connections, starts = described.result(), connections.result(), starts.result()
+
+    ids = set(ws['WorkspaceId'] for ws in described)
+    metrics = {}
+    for ws in described:
+        key = 'State_{}'.format(ws['State'])
+        metrics[key] = metrics.get(key, 0) + 1
+
+    idle, resume = [], []
+    for status in connections:
+        if status['WorkspaceId'] not in ids:
+            continue
+        key = 'Connection_{}'.format(status.get('ConnectionState', 'UNKNOWN'))
+        metrics[key] = metrics.get(key, 0) + 1
+
+        last = status.get('LastKnownUserConnectionTimestamp')
+        if last is None:
+            continue
+        idle.append((now - last).total_seconds())
+        started = starts.get(status['WorkspaceId'])
+        if started is not None and last > started:
+            resume.append((last - started).total_seconds())
+
+    metrics['WorkSpaces'] = len(described)
+    metrics['SecondsSinceLastConnection'] = _sample(idle)
+    metrics['ResumeToConnectedSeconds'] = _sample(resume)
+    return metrics
+
+
+def emf(metrics, directory_id, now):
+    # One Embedded Metric Format document carrying all metrics of this run
+    units = { 'SecondsSinceLastConnection': 'Seconds', 'ResumeToConnectedSeconds': 'Seconds' }
+    document = {
+        '_aws': {
+            'Timestamp': int(now.timestamp() * 1000),
+            'CloudWatchMetrics': [ {
+                'Namespace': NAMESPACE,
+                'Dimensions': [ [ 'DirectoryId' ] ],
+                'Metrics': [ { 'Name': name, 'Unit': units.get(name, 'Count') }
+                             for name, value in sorted(metrics.items()) if value != [] ]
+            } ]
+        },
+        'DirectoryId': directory_id
+    }
+    document.update((name, value) for name, value in metrics.items() if value != [])
+    return json.dumps(document, default = str)
+
+
+def handler(event, context):
+    directory_id = event.get('DirectoryId') or os.environ['DIRECTORY_ID']
+    period = timedelta(minutes = int(os.environ.get('PERIOD_MINUTES', '60')))
+    started = time.time()
+    now = datetime.now(timezone.utc)
+
+    metrics = collect(directory_id, now, period)
+    print(emf(metrics, directory_id, now))
+    return { 'WorkSpaces': metrics['WorkSpaces'], 'Seconds': round(time.time() - started, 3) }
@@ -0,0 +1,131 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import continuation
+from clients import client
+from retry import call_with_backoff, chunks, has_tags
+
+# StartWorkspaces and DescribeWorkspaces(WorkspaceIds) take at most 25 IDs
+MAX_BATCH = 25
+
+# Seconds between checks for AVAILABLE WorkSpaces before shift start
+POLL_SECONDS = 30
+
+# Hand off to a new invocation when less than this many seconds are left
+HANDOFF_SECONDS = 40
+
+
+def select_workspaces(directory_id, tags = None, users = None, max_workers = 8):
+    """WorkSpaces in the directory, optionally limited to users and to matching tags."""
+    users = set(u.lower() for u in users) if users else None
+    selected = []
+    paginator = client('workspaces').get_paginator('describe_workspaces')
+    for page in paginator.paginate(DirectoryId = directory_id):
+        for ws in page['Workspaces']:
+            if users is None or ws['UserName'].lower() in users:
+                selected.append(ws)
+
+    if tags:
+        # Tags are not part of DescribeWorkspaces, look them up concurrently
+        with ThreadPoolExecutor(max_workers = max_workers) as pool:
+            matches = list(pool.map(lambda ws: has_tags(client('workspaces'), ws['WorkspaceId'], tags), selected))
+        selected = [ ws for ws, match in zip(selected, matches) if match ]
+    return selected
+
+
+def _start_batch(ids):
+    response = call_with_backoff(
+        client('workspaces').start_workspaces,
+        StartWorkspaceRequests = [ { 'WorkspaceId': i } for i in ids ]
+    )
+    return response.get('FailedRequests', [])
+
+
+def ramp_start(workspace_ids, ramp_seconds, max_in_flight = 4, sleep = time.sleep, clock = time.monotonic):
+    """Start WorkSpaces in batches of 25, spread evenly over ramp_seconds."""
+    batches = chunks(workspace_ids, MAX_BATCH)
+    if not batches:
+        return []
+    interval = ramp_seconds / float(len(batches))
+    started = clock()
+    futures = []
+    with ThreadPoolExecutor(max_workers = max_in_flight) as pool:
+        for index, batch in enumerate(batches):
+            delay = started + index * interval - clock()
+            if delay > 0:
+                sleep(delay)
+            futures.append(pool.submit(_start_batch, batch))
+    return [ failed for f in futures for failed in f.result() ]
+
+
+def count_available(workspace_ids):
+    available = 0
+    for batch in chunks(workspace_ids, MAX_BATCH):
+        for ws in client('workspaces').describe_workspaces(WorkspaceIds = batch)['Workspaces']:
+            if ws['State'] == 'AVAILABLE':
+                available += 1
+    return available
+
+
+def handler(event, context):
+    # event: {"Group", "DirectoryId", "Tags", "Users", "LeadMinutes", "RampMinutes", "MaxInFlight"}
+    state = continuation.state(event)
+    shift_start = state['Started'] + 60 * int(event['LeadMinutes'])
+
+    if continuation.CONTINUATION_KEY not in event:
+        selected = select_workspaces(event['DirectoryId'], event.get('Tags'), event.get('Users'))
+        ids = [ ws['WorkspaceId'] for ws in selected ]
+        stopped = [ ws['WorkspaceId'] for ws in selected if ws['State'] == 'STOPPED' ]
+
+        # The ramp has to fit into this invocation
+        ramp = min(60 * int(event.get('RampMinutes', 10)),
+                   continuation.remaining_seconds(context) - 2 * HANDOFF_SECONDS)
+        failed = ramp_start(stopped, max(ramp, 0), int(event.get('MaxInFlight', 4)))
+        state.update({
+            'WorkspaceIds': ids,
+            'Starting': len(stopped),
+            'Failed': [ { 'WorkspaceId': f['WorkspaceRequest']['WorkspaceId'],
+                          'ErrorCode': f.get('ErrorCode') } for f in failed ]
+        })
+        event = dict(event, **{ continuation.CONTINUATION_KEY: state })
+
+    ids = state['WorkspaceIds']
+    while True:
+        available = count_available(ids)
+        if available == len(ids) or time.time() >= shift_start:
+            break
+        if continuation.remaining_seconds(context) - POLL_SECONDS < HANDOFF_SECONDS:
+            continuation.continue_later(event, context)
+            return
+        time.sleep(POLL_SECONDS)
+
+    report = {
+        'Group': event.get('Group'),
+        'Selected': len(ids),
+        'Started': state['Starting'],
+        'Failed': state['Failed'],
+        'Available': available,
+        'AllAvailable': available == len(ids),
+        'SecondsBeforeShiftStart': round(shift_start - time.time())
+    }
+    print(json.dumps(report))
+    return report
@@ -0,0 +1,179 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import client as aws_client
+from retry import THROTTLING_ERRORS, backoff_delays, call_with_backoff, chunks
+
+# CreateWorkspaces accepts at most 25 WorkSpaces per call
+MAX_BATCH = 25
+
+# States of a WorkSpace that no longer counts as the user's WorkSpace
+GONE_STATES = ('TERMINATING', 'TERMINATED')
+
+# FailedRequests error codes worth another round, anything else (unknown user,
+# invalid parameters, limits) fails the same way again
+RETRYABLE_ERRORS = THROTTLING_ERRORS + (
+    'InternalError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'OperationInProgress'
+)
+
+
+def existing_users(client, directory_id):
+    # Users in the directory that already own a WorkSpace
+    users = set()
+    paginator = client.get_paginator('describe_workspaces')
+    for page in paginator.paginate(DirectoryId=directory_id):
+        for ws in page['Workspaces']:
+            if ws['State'] not in GONE_STATES:
+                users.add(ws['UserName'].lower())
+    return users
+
+
+class ProvisioningReport(object):
+
+    def __init__(self):
+        self.created = []
+        self.skipped = []
+        self.failed = []
+        self.timed_out = []
+        self.batches = 0
+        self.elapsed = 0.0
+        self.ready_seconds = {}
+
+    @property
+    def per_minute(self):
+        return len(self.created) * 60.0 / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'Created': len(self.created),
+            'Skipped': len(self.skipped),
+            'Failed': self.failed,
+            'TimedOut': self.timed_out,
+            'Batches': self.batches,
+            'ElapsedSeconds': round(self.elapsed, 3),
+            'WorkSpacesPerMinute': round(self.per_minute, 2),
+            'SecondsToAvailableByBundle': {
+                bundle: {'Count': len(d), 'Median': round(sorted(d)[len(d) // 2]), 'Max': round(max(d))}
+                for bundle, d in self.ready_seconds.items()
+            }
+        }
+
+
+def _create_batch(client, batch, sleep):
+    response = call_with_backoff(client.create_workspaces, Workspaces=batch, sleep=sleep)
+    return response.get('PendingRequests', []), response.get('FailedRequests', [])
+
+
+def wait_until_available(client, report, started, timeout=3600, poll=30,
+                         sleep=time.sleep, clock=time.monotonic):
+    # Record, per bundle, the seconds from the start of provisioning until each WorkSpace is AVAILABLE
+    remaining = {p['WorkspaceId']: p['BundleId'] for p in report.created}
+    deadline = clock() + timeout
+    while remaining and clock() < deadline:
+        for batch in chunks(list(remaining), MAX_BATCH):
+            response = call_with_backoff(client.describe_workspaces, WorkspaceIds=batch, sleep=sleep)
+            for ws in response['Workspaces']:
+                if ws['State'] == 'AVAILABLE':
+                    bundle = remaining.pop(ws['WorkspaceId'])
+                    report.ready_seconds.setdefault(bundle, []).append(clock() - started)
+                elif ws['State'] == 'ERROR':
+                    remaining.pop(ws['WorkspaceId'])
+                    report.failed.append({'UserName': ws['UserName'], 'ErrorCode': 'ERROR'})
+        if remaining:
+            sleep(poll)
+    # Still not AVAILABLE at the deadline
+    report.timed_out = sorted(remaining)
+
+
+def provision(requests, client, batch_size=MAX_BATCH, max_in_flight=4, max_rounds=5,
+              wait=False, sleep=time.sleep, clock=time.monotonic):
+    """Create WorkSpaces for requests, skipping users that already have one.
+
+    requests are CreateWorkspaces WorkspaceRequest dicts. Each round sends all
+    pending requests in batches, max_in_flight batches at a time, and the next
+    round retries only the items that came back in FailedRequests with a
+    retryable error code. With wait,
+    it also waits until the WorkSpaces are AVAILABLE and records how long that
+    took per bundle, to compare bundle versions.
+    """
+    report = ProvisioningReport()
+    started = clock()
+
+    existing = {}
+    pending = []
+    for request in requests:
+        directory_id = request['DirectoryId']
+        if directory_id not in existing:
+            existing[directory_id] = existing_users(client, directory_id)
+        if request['UserName'].lower() in existing[directory_id]:
+            report.skipped.append(request['UserName'])
+        else:
+            pending.append(request)
+
+    failed = []
+    retrying = []
+    delays = backoff_delays(max_rounds)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for _ in range(max_rounds):
+            if not pending:
+                break
+            batches = chunks(pending, min(batch_size, MAX_BATCH))
+            report.batches += len(batches)
+            results = pool.map(lambda b: _create_batch(client, b, sleep), batches)
+
+            retrying = []
+            for created, errors in results:
+                report.created.extend(created)
+                for f in errors:
+                    (retrying if f.get('ErrorCode') in RETRYABLE_ERRORS else failed).append(f)
+
+            pending = [f['WorkspaceRequest'] for f in retrying]
+            if pending:
+                sleep(next(delays))
+
+    # Items still failing with a retryable error after the last round
+    failed.extend(retrying)
+
+    report.failed = [
+        {'UserName': f['WorkspaceRequest']['UserName'],
+         'ErrorCode': f.get('ErrorCode'),
+         'ErrorMessage': f.get('ErrorMessage')}
+        for f in failed
+    ]
+    report.elapsed = clock() - started
+    if wait:
+        wait_until_available(client, report, started, sleep=sleep, clock=clock)
+    return report
+
+
+def handler(event, context):
+    # event: {"Workspaces": [WorkspaceRequest, ...], "MaxInFlight": 4, "WaitUntilAvailable": false}
+    report = provision(
+        event['Workspaces'], aws_client('workspaces'),
+        max_in_flight=int(event.get('MaxInFlight', 4)),
+        wait=bool(event.get('WaitUntilAvailable'))
+    )
+    print(json.dumps(report.as_dict()))
+    return report.as_dict()
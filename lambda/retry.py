@@ -0,0 +1,75 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+# Error codes the AWS APIs use to signal request throttling
+THROTTLING_ERRORS = (
+    'ThrottlingException',
+    'Throttling',
+    'RequestLimitExceeded',
+    'TooManyRequestsException'
+)
+
+
+def chunks(items, size):
+    # Split a list into consecutive batches of at most size items
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def is_throttling(error):
+    return isinstance(error, ClientError) and \
+        error.response.get('Error', {}).get('Code') in THROTTLING_ERRORS
+
+
+def backoff_delays(attempts=8, base=0.5, cap=20.0):
+    # Exponential backoff with full jitter, one delay per retry
+    for attempt in range(attempts):
+        yield random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_backoff(fn, *args, attempts=8, base=0.5, cap=20.0, sleep=time.sleep, **kwargs):
+    # Call fn, retrying only on throttling errors
+    for delay in backoff_delays(attempts, base, cap):
+        try:
+            return fn(*args, **kwargs)
+        except ClientError as e:
+            if not is_throttling(e):
+                raise
+            sleep(delay)
+    return fn(*args, **kwargs)
+
+
+def has_tags(client, workspace_id, tags, acquire=None, sleep=time.sleep):
+    """True if the WorkSpace carries all tags, with DescribeTags retried when throttled.
+
+    Tag selection makes one call per WorkSpace, so a large directory runs into
+    the DescribeTags rate limit. acquire, if given, is called before every
+    attempt, e.g. to go through a rate limiter.
+    """
+    def describe(**kwargs):
+        if acquire is not None:
+            acquire()
+        return client.describe_tags(**kwargs)
+
+    found = call_with_backoff(describe, ResourceId=workspace_id, sleep=sleep)['TagList']
+    found = {t['Key']: t.get('Value') for t in found}
+    return all(found.get(k) == v for k, v in tags.items())
@@ -0,0 +1,175 @@
+#
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy of this
+#  software and associated documentation files (the "Software"), to deal in the Software
+#  without restriction, including without limitation the rights to use, copy, modify,
+#  merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+#  INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#  HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+#  OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+#  SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# 
+
+import json
+import os
+import threading
+import time
+
+# Per-call timing of AWS API calls and CloudFormation responses, as one JSON
+# log line per call. Off unless TRACING is set on the function, then clients
+# get no event hooks at all. With the opentelemetry API importable, each call
+# also becomes a span, which the ADOT layer exports to X-Ray.
+ENABLED = os.environ.get('TRACING', '').lower() in ('1', 'true', 'on')
+
+_sink = None
+_tracer = None
+
+
+def enable(on=True):
+    # Only clients created afterwards are instrumented
+    global ENABLED
+    ENABLED = on
+
+
+def set_sink(sink):
+    """Send records to sink(record) instead of the log, returns the previous sink."""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+class MemorySink(object):
+    """Collects records, for assertions in tests and benchmarks."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def of(self, kind):
+        with self._lock:
+            return [r for r in self.records if r['type'] == kind]
+
+
+def emit(record):
+    if _sink is not None:
+        _sink(record)
+    else:
+        print(json.dumps(record, default=str))
+
+
+def tracer():
+    # None without the OpenTelemetry API, spans are optional
+    global _tracer
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer('workspaces-sapgui')
+        except ImportError:
+            _tracer = False
+    return _tracer or None
+
+
+def _before_call(model, context, **kwargs):
+    # after-call-error gets no model, keep it with the request context
+    context['trace_model'] = model
+    context['trace_started'] = time.perf_counter()
+    t = tracer()
+    if t is not None:
+        context['trace_span'] = t.start_span(
+            '{}.{}'.format(model.service_model.service_name, model.name),
+            attributes={'rpc.system': 'aws-api', 'rpc.service': model.service_model.service_name,
+                        'rpc.method': model.name})
+
+
+def _finish(context, status=None, metadata=None, error=None):
+    started = context.pop('trace_started', None)
+    model = context.pop('trace_model', None)
+    if started is None or model is None:
+        return
+    metadata = metadata or {}
+    record = {
+        'type': 'aws_call',
+        'service': model.service_model.service_name,
+        'operation': model.name,
+        'ms': round((time.perf_counter() - started) * 1000, 1),
+        'retries': metadata.get('RetryAttempts', 0),
+        'status': status,
+        'error': error,
+        'request_id': metadata.get('RequestId')
+    }
+    span = context.pop('trace_span', None)
+    if span is not None:
+        span.set_attribute('aws.retries', record['retries'])
+        if error:
+            span.set_attribute('error', True)
+            span.set_attribute('aws.error_code', error)
+        span.end()
+    emit(record)
+
+
+def _after_call(http_response, parsed, context, **kwargs):
+    _finish(context, http_response.status_code, parsed.get('ResponseMetadata'),
+            parsed.get('Error', {}).get('Code'))
+
+
+def _after_call_error(context, exception, **kwargs):
+    # Connection errors and timeouts never get a response
+    _finish(context, error=type(exception).__name__)
+
+
+def instrument(client):
+    """Hook timing into every call of a boto3 client, a no-op while tracing is off."""
+    if ENABLED:
+        events = client.meta.events
+        events.register('before-call.*.*', _before_call)
+        events.register('after-call.*.*', _after_call)
+        events.register('after-call-error.*.*', _after_call_error)
+    return client
+
+
+class _Timed(object):
+
+    def __init__(self, kind, fields):
+        self.record = dict(fields, type=kind)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['ms'] = round((time.perf_counter() - self.started) * 1000, 1)
+        if exc_type is not None:
+            self.record.setdefault('error', exc_type.__name__)
+        emit(self.record)
+        return False
+
+
+class _Untimed(object):
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_UNTIMED = _Untimed()
+
+
+def timed(kind, **fields):
+    """Time a block and log it as one record, the block may add fields to the yielded dict.
+
+        with tracing.timed('cfn_response', request_id=...) as record:
+            record['status'] = ...
+    """
+    return _Timed(kind, fields) if ENABLED else _UNTIMED
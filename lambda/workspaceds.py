@@ -17,36 +17,159 @@
 # 
 
 import json
-import boto3
 import os
+import time
 import cfnresponse
+import continuation
 import logging
-import threading
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from clients import client
+from retry import call_with_backoff, chunks
+
+# Directory state once WorkSpaces can be launched into it
+READY_STATE = 'REGISTERED'
+FAILED_STATES = ('ERROR', 'DEREGISTERED')
+
+# Hand off to a new invocation when less than this many seconds are left
+HANDOFF_SECONDS = 20
+
+# TerminateWorkspaces accepts at most 25 WorkSpaces per call
+MAX_BATCH = 25
+
+
+def describe_directory(directory_id):
+    directories = client('workspaces').describe_workspace_directories(
+        DirectoryIds = [ directory_id ]
+    )['Directories']
+    return directories[0] if directories else None
+
+
+def directory_state(directory_id):
+    directory = describe_directory(directory_id)
+    return directory['State'] if directory else None
+
+
+def check_subnets(directory, subnets):
+    # WorkSpaces cannot move a registered directory, so a changed subnet list fails the update
+    registered = sorted(directory.get('SubnetIds', []))
+    if subnets and registered and registered != sorted(subnets):
+        raise Exception(
+            "Directory {} is registered with subnets {}, not {}. Terminate its WorkSpaces and "
+            "deregister it before changing WorkSpacesSubnets".format(
+                directory['DirectoryId'], ",".join(registered), ",".join(sorted(subnets))))
+
+
+def wait_until_registered(directory_id, context, interval = 2.0, max_interval = 15.0):
+    # Poll with a growing interval, return False if the deadline comes first
+    while True:
+        state = directory_state(directory_id)
+        if state == READY_STATE:
+            return True
+        if state in FAILED_STATES:
+            raise Exception("Directory {} is in state {}".format(directory_id, state))
+        if continuation.remaining_seconds(context) - interval < HANDOFF_SECONDS:
+            return False
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+
+
+def directory_workspaces(directory_id):
+    # WorkSpaces on the directory that are not terminated yet
+    workspaces = []
+    paginator = client('workspaces').get_paginator('describe_workspaces')
+    for page in paginator.paginate(DirectoryId = directory_id):
+        workspaces.extend(ws for ws in page['Workspaces'] if ws['State'] != 'TERMINATED')
+    return workspaces
+
+
+def _terminate_batch(ids):
+    return call_with_backoff(
+        client('workspaces').terminate_workspaces,
+        TerminateWorkspaceRequests = [ { 'WorkspaceId': i } for i in ids ]
+    ).get('FailedRequests', [])
+
+
+def teardown(directory_id, context, max_in_flight = 4, interval = 5.0, max_interval = 30.0):
+    """Terminate all WorkSpaces on the directory, then deregister it.
+
+    Returns False if the deadline comes first; the next invocation picks up
+    from the WorkSpaces that are still left.
+    """
+    if directory_state(directory_id) in (None, 'DEREGISTERING', 'DEREGISTERED'):
+        return True
+
+    workspaces = directory_workspaces(directory_id)
+    ids = [ ws['WorkspaceId'] for ws in workspaces if ws['State'] != 'TERMINATING' ]
+    with ThreadPoolExecutor(max_workers = max_in_flight) as pool:
+        failed = [ f for batch in pool.map(_terminate_batch, chunks(ids, MAX_BATCH)) for f in batch ]
+    for f in failed:
+        logging.warning('Terminate %s failed: %s', f['WorkspaceId'], f.get('ErrorCode'))
+
+    while workspaces:
+        if continuation.remaining_seconds(context) - interval < HANDOFF_SECONDS:
+            return False
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+        workspaces = directory_workspaces(directory_id)
+
+    client('workspaces').deregister_workspace_directory(
+        DirectoryId = directory_id
+    )
+    return True
 
-client = boto3.client('workspaces')
-responseStr = {'Status' : {}}
 
 def handler(event, context):
+    with tracing.timed('invocation', function='workspaceds', request_type=event['RequestType'],
+                       invocation=continuation.state(event)['Invocation']):
+        _handle(event, context)
+
+
+def _handle(event, context):
+
+    directory_id = os.environ['DIRECTORY_ID']
+    responseStr = {'Status' : {}}
+    with cfnresponse.Watchdog(event, context) as watchdog:
+        status = cfnresponse.SUCCESS
+        try:
+            if event['RequestType'] == 'Delete':
+                if continuation.expired(event):
+                    raise Exception("WorkSpaces on {} were not terminated in time".format(directory_id))
+                if not teardown(directory_id, context):
+                    watchdog.cancel()
+                    continuation.continue_later(event, context)
+                    return
+                responseStr['Status']['LambdaFunction'] = "Deregister Successfully"
+
+            else:
+                # The subnets the WorkSpaces get their ENIs in, a resource property so a change updates it
+                subnets = event['ResourceProperties'].get('SubnetIds') or []
+                directory = describe_directory(directory_id)
+                if directory and directory['State'] == READY_STATE:
+                    check_subnets(directory, subnets)
+                    responseStr['Status']['LambdaFunction'] = "Already Registered"
+                else:
+                    if continuation.CONTINUATION_KEY not in event:
+                        client('workspaces').register_workspace_directory(
+                            DirectoryId= directory_id,
+                            EnableWorkDocs = False,
+                            **({ 'SubnetIds': subnets } if subnets else {})
+                        )
+                    if continuation.expired(event):
+                        raise Exception("Directory {} did not become ready in time".format(directory_id))
+                    if not wait_until_registered(directory_id, context):
+                        # Registration is still running, the next invocation responds to CloudFormation
+                        watchdog.cancel()
+                        continuation.continue_later(event, context)
+                        return
+                    responseStr['Status']['LambdaFunction'] = "Register Successfully"
+
+        except Exception as e:
+            logging.error('Exception: %s' % e, exc_info=True)
+            responseStr['Status']['LambdaFunction'] = str(e)
+            status = cfnresponse.FAILED
 
-    status = cfnresponse.SUCCESS
-    try:
-        if event['RequestType'] == 'Delete':
-            client.deregister_workspace_directory(
-                DirectoryId = os.environ['DIRECTORY_ID']
-            )
-            responseStr['Status']['LambdaFunction'] = "Deregister Successfully"
-
-        else:
-            client.register_workspace_directory(
-                DirectoryId= os.environ['DIRECTORY_ID'],
-                EnableWorkDocs = False
-            )
-            responseStr['Status']['LambdaFunction'] = "Register Successfully"
-
-    except Exception as e:
-        logging.error('Exception: %s' % e, exc_info=True)
-        responseStr['Status']['LambdaFunction'] = str(e)
-        status = cfnresponse.FAILED
-
-    finally:
-        cfnresponse.send(event, context, status, {'Status':json.dumps(responseStr)}, None)
+        # Keep the physical ID stable so an Update never looks like a replacement
+        physical_id = event.get('PhysicalResourceId', directory_id)
+        if not cfnresponse.send(event, context, status, {'Status':json.dumps(responseStr)}, physical_id):
+            logging.error('Could not deliver %s to CloudFormation for request %s', status, event['RequestId'])
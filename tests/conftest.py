@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The CDK app is imported from the repository root, the Lambda code from lambda/ as in the runtime
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "lambda"))
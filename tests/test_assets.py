@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from WorkSpaces import assets
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+@pytest.fixture
+def build_dir(tmp_path, monkeypatch):
+    build = tmp_path / "build"
+    monkeypatch.setattr(assets, "BUILD_DIR", str(build))
+    monkeypatch.setattr(assets, "LAMBDA_SOURCE", os.path.join(ROOT, "lambda"))
+    monkeypatch.setattr(assets, "_staged", {})
+    return build
+
+
+def test_same_content_stages_into_the_same_directory_once(tmp_path, build_dir, monkeypatch):
+    source = tmp_path / "handler.py"
+    source.write_text("def handler(event, context):\n    return 1\n")
+
+    first = assets.stage("handler", { "handler.py": str(source) })
+    staged = os.path.join(first, "handler.py")
+    written = os.stat(staged).st_mtime_ns
+
+    # A new synth process, the in-memory cache is empty but the directory is on disk
+    monkeypatch.setattr(assets, "_staged", {})
+    copies = []
+    monkeypatch.setattr(assets.shutil, "copyfile", lambda *args: copies.append(args))
+    assert assets.stage("handler", { "handler.py": str(source) }) == first
+    assert copies == []
+    assert os.stat(staged).st_mtime_ns == written
+
+
+def test_changed_content_stages_into_a_new_directory(tmp_path, build_dir):
+    source = tmp_path / "handler.py"
+    source.write_text("def handler(event, context):\n    return 1\n")
+    first = assets.stage("handler", { "handler.py": str(source) })
+
+    source.write_text("def handler(event, context):\n    return 2\n")
+    assets._staged.clear()
+    second = assets.stage("handler", { "handler.py": str(source) })
+
+    assert second != first
+    assert os.path.basename(second).startswith("handler-")
+    with open(os.path.join(second, "handler.py")) as fp:
+        assert "return 2" in fp.read()
+    with open(os.path.join(first, "handler.py")) as fp:
+        assert "return 1" in fp.read()
+
+
+def test_layer_holds_the_shared_modules(build_dir):
+    from aws_cdk import core
+
+    stack = core.Stack(core.App(), "Test")
+    layer = assets.shared_layer(stack)
+    assert assets.shared_layer(stack) is layer
+
+    [ staged ] = [ d for d in os.listdir(str(build_dir)) if d.startswith("layer-") ]
+    modules = sorted(os.listdir(os.path.join(str(build_dir), staged, "python")))
+    assert modules == sorted(m + ".py" for m in assets.SHARED_MODULES)
+    for module in ( "retry", "clients", "continuation", "tracing" ):
+        assert module + ".py" in modules
@@ -0,0 +1,39 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import Stubber
+
+import bundlepipeline
+import clients
+
+
+class Context(object):
+
+    def get_remaining_time_in_millis(self):
+        return 600 * 1000
+
+
+@pytest.fixture
+def workspaces(monkeypatch):
+    client = boto3.client(
+        "workspaces", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+    monkeypatch.setitem(clients._clients, "workspaces", client)
+    monkeypatch.setattr(bundlepipeline.time, "sleep", lambda seconds: None)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_image_not_listed_yet_counts_as_pending(workspaces):
+    # Right after CreateWorkspaceImage the image may be missing from DescribeWorkspaceImages
+    workspaces.add_response("describe_workspace_images", { "Images": [] }, { "ImageType": "OWNED" })
+    workspaces.add_response(
+        "describe_workspace_images",
+        { "Images": [ { "ImageId": "wsi-12345678", "Name": "sapgui-7.70", "State": "AVAILABLE" } ] },
+        { "ImageType": "OWNED" }
+    )
+
+    image = bundlepipeline.wait_until_available("sapgui-7.70", Context(), interval = 0)
+    assert image["ImageId"] == "wsi-12345678"
@@ -0,0 +1,29 @@
+import io
+
+import pytest
+
+from WorkSpaces.capacity import SubnetCapacityError, check, plan
+
+SUBNETS = [ ( "subnet-0aaaaaaa", "eu-central-1a" ), ( "subnet-0bbbbbbb", "eu-central-1b" ) ]
+
+
+def test_deployed_workspaces_count_as_available_to_the_fleet():
+    # 200 WorkSpaces over two subnets, the first wave of 160 already holds IPs in them
+    capacity = {
+        "subnet-0aaaaaaa": { "available": 30, "workspaces": 80 },
+        "subnet-0bbbbbbb": { "available": 30, "workspaces": 80 }
+    }
+    rows = plan(SUBNETS, capacity, 200, {}, 10)
+    assert [ r["required"] for r in rows ] == [ 110, 110 ]
+    assert all(r["ok"] for r in rows)
+
+
+def test_new_workspaces_that_do_not_fit_fail():
+    capacity = {
+        "subnet-0aaaaaaa": { "available": 20, "workspaces": 80 },
+        "subnet-0bbbbbbb": { "available": 30, "workspaces": 80 }
+    }
+    rows = plan(SUBNETS, capacity, 200, {}, 10)
+    assert [ r["ok"] for r in rows ] == [ False, True ]
+    with pytest.raises(SubnetCapacityError, match = "TOO SMALL"):
+        check(rows, 200, out = io.StringIO())
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("urllib3")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+import cfnresponse
+from fakeaws import FakeAWS, FakeContext, cfn_event
+
+
+@pytest.fixture
+def fake():
+    server = FakeAWS(callback_failure_rate = 1.0).start()
+    yield server
+    server.stop()
+
+
+def test_watchdog_sends_failed_once_within_its_margin(fake, caplog):
+    event = cfn_event("Create", fake.url + "/cfn", request_id = "watchdog")
+    context = FakeContext(timeout = 6.0)
+
+    started = time.time()
+    with cfnresponse.Watchdog(event, context, margin_ms = 5000) as watchdog:
+        watchdog.timer.join(5.0)
+    elapsed = time.time() - started
+
+    # A failing ResponseURL gets one attempt, not the pool's retries with backoff
+    assert fake.cfn_attempts == 1
+    assert elapsed < 3.0
+    assert "could not deliver FAILED" in caplog.text
+
+
+def test_send_reports_failed_delivery(fake):
+    event = cfn_event("Create", fake.url + "/cfn", request_id = "send")
+    assert cfnresponse.send(event, FakeContext(), cfnresponse.SUCCESS, {}, retries = False) is False
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from cfn import synth
+
+# Resource types each AD_dns_mode adds, and the one that makes the domain resolvable
+MODES = {
+    "hostedzone": ( { "AWS::Route53::HostedZone", "AWS::Route53::RecordSet" }, "AWS::Route53::RecordSet" ),
+    "dhcp": ( { "AWS::EC2::DHCPOptions", "AWS::EC2::VPCDHCPOptionsAssociation" }, "AWS::EC2::VPCDHCPOptionsAssociation" ),
+    "resolver": ( { "AWS::Route53Resolver::ResolverEndpoint", "AWS::Route53Resolver::ResolverRule",
+                    "AWS::Route53Resolver::ResolverRuleAssociation" }, "AWS::Route53Resolver::ResolverRuleAssociation" )
+}
+DNS_TYPES = set().union(*(types for types, _ in MODES.values()))
+
+
+def _ad_template(tmp_path, mode):
+    return synth(tmp_path, AD_dns_mode = mode)["AWSManagedAD.template.json"]["Resources"]
+
+
+def _of_type(resources, type_name):
+    return [ k for k, v in resources.items() if v["Type"] == type_name ]
+
+
+def _depends_on(resource):
+    depends = resource.get("DependsOn", [])
+    return [ depends ] if isinstance(depends, str) else depends
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+def test_dns_mode_resources(tmp_path, mode):
+    resources = _ad_template(tmp_path, mode)
+    expected, _ = MODES[mode]
+    present = { v["Type"] for v in resources.values() } & DNS_TYPES
+    assert present == expected
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+def test_admin_instance_joins_after_dns(tmp_path, mode):
+    resources = _ad_template(tmp_path, mode)
+    _, ready_type = MODES[mode]
+    ready = _of_type(resources, ready_type)
+    assert len(ready) == 1
+
+    for type_name in ( "AWS::EC2::Instance", "AWS::SSM::Association" ):
+        for logical_id in _of_type(resources, type_name):
+            assert ready[0] in _depends_on(resources[logical_id]), logical_id
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+def test_join_document_sets_dns_only_with_a_hosted_zone(tmp_path, mode):
+    resources = _ad_template(tmp_path, mode)
+    document, = _of_type(resources, "AWS::SSM::Document")
+    # Lines with tokens are Fn::Join objects, the DNS steps are plain strings
+    script = json.dumps(resources[document]["Properties"]["Content"]["mainSteps"][0]["inputs"]["runCommand"])
+    assert ("netsh.exe" in script) == (mode == "hostedzone")
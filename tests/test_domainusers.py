@@ -0,0 +1,98 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import Stubber
+
+import clients
+import domainusers
+
+INSTANCE = "i-0123456789abcdef0"
+ASSOCIATION = "a1b2c3d4-5678-90ab-cdef-111111111111"
+
+
+@pytest.fixture
+def ssm(monkeypatch):
+    client = boto3.client(
+        "ssm", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+    monkeypatch.setitem(clients._clients, "ssm", client)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def _association(stubber, status):
+    stubber.add_response(
+        "describe_instance_associations_status",
+        { "InstanceAssociationStatusInfos": [ { "AssociationId": ASSOCIATION, "Status": status } ] },
+        { "InstanceId": INSTANCE }
+    )
+
+
+def _instance(stubber, computer_name, ping = "Online"):
+    stubber.add_response(
+        "describe_instance_information",
+        { "InstanceInformationList": [ { "InstanceId": INSTANCE, "PingStatus": ping, "ComputerName": computer_name } ] },
+        { "Filters": [ { "Key": "InstanceIds", "Values": [ INSTANCE ] } ] }
+    )
+
+
+def test_not_joined_while_the_association_runs(ssm):
+    _association(ssm, "Pending")
+    assert not domainusers.joined(INSTANCE, "test.lab", ASSOCIATION)
+
+
+def test_not_joined_before_the_reboot(ssm):
+    # Online right after Add-Computer, the domain shows up in the name only after Restart-Computer
+    _association(ssm, "Success")
+    _instance(ssm, "EC2AMAZ-ABC123")
+    assert not domainusers.joined(INSTANCE, "test.lab", ASSOCIATION)
+
+
+def test_joined_after_the_reboot(ssm):
+    _association(ssm, "Success")
+    _instance(ssm, "EC2AMAZ-ABC123.TEST.LAB")
+    assert domainusers.joined(INSTANCE, "test.lab", ASSOCIATION)
+
+
+def test_failed_join_fails_the_resource(ssm):
+    _association(ssm, "Failed")
+    with pytest.raises(Exception, match = "failed"):
+        domainusers.joined(INSTANCE, "test.lab", ASSOCIATION)
+
+
+class Context(object):
+
+    def get_remaining_time_in_millis(self):
+        return 600 * 1000
+
+
+def test_command_killed_by_a_reboot_is_sent_once_more(ssm, monkeypatch):
+    monkeypatch.setattr(domainusers.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(domainusers, "joined", lambda *args: True)
+    event = { "ResourceProperties": {
+        "InstanceId": INSTANCE, "DomainName": "test.lab", "PasswordSecretArn": "arn", "AdminUser": "Admin",
+        "InitialPasswordPrefix": "workspaces/initial-password/", "Users": [ { "SamAccountName": "user" } ]
+    } }
+    for command_id, status in ( ( "11111111-1111-1111-1111-111111111111", "Failed" ), ( "22222222-2222-2222-2222-222222222222", "Success" ) ):
+        ssm.add_response("send_command", { "Command": { "CommandId": command_id } })
+        ssm.add_response(
+            "get_command_invocation",
+            { "CommandId": command_id, "InstanceId": INSTANCE, "Status": status },
+            { "CommandId": command_id, "InstanceId": INSTANCE }
+        )
+
+    invocation = domainusers.run(event, Context(), interval = 0)
+    assert invocation["Status"] == "Success"
+
+
+def test_script_stores_the_initial_password_before_creating_the_user():
+    text = domainusers.script({
+        "DomainName": "test.lab", "PasswordSecretArn": "arn:secret", "AdminUser": "Admin",
+        "InitialPasswordPrefix": "workspaces/initial-password/",
+        "Users": [ { "SamAccountName": "hank", "GivenName": "Hank", "Surname": "Lab", "EmailAddress": "hank@test.lab" } ]
+    })
+    assert "$name = 'workspaces/initial-password/' + $sam" in text
+    assert text.index("New-SECSecret") < text.index("New-ADUser")
+    assert "Write-SECSecretValue" in text
@@ -0,0 +1,115 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+from botocore.stub import Stubber
+
+import clients
+import inventory
+
+TABLE = "inventory-test"
+
+
+def _workspace(workspace_id, state, user = "alice"):
+    return {
+        "WorkspaceId": workspace_id, "DirectoryId": "d-1234567890", "UserName": user,
+        "BundleId": "wsb-12345678", "State": state
+    }
+
+
+@pytest.fixture
+def table(monkeypatch):
+    # DynamoDB runs locally in moto, WorkSpaces is stubbed
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    monkeypatch.setenv("INVENTORY_TABLE", TABLE)
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising = False)
+    monkeypatch.delenv("AWS_ENDPOINT_URL_DYNAMODB", raising = False)
+    monkeypatch.setattr(clients, "_clients", {})
+    with moto.mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name = "us-west-2")
+        dynamodb.create_table(
+            TableName = TABLE,
+            KeySchema = [ { "AttributeName": "WorkspaceId", "KeyType": "HASH" } ],
+            AttributeDefinitions = [
+                { "AttributeName": name, "AttributeType": "S" }
+                for name in ( "WorkspaceId", "UserName", "BundleId", "State" )
+            ],
+            GlobalSecondaryIndexes = [
+                { "IndexName": index, "KeySchema": [ { "AttributeName": attribute, "KeyType": "HASH" } ],
+                  "Projection": { "ProjectionType": "ALL" } }
+                for index, attribute in ( ( "ByUser", "UserName" ), ( "ByBundle", "BundleId" ), ( "ByState", "State" ) )
+            ],
+            BillingMode = "PAY_PER_REQUEST"
+        )
+        yield inventory.table()
+
+
+@pytest.fixture
+def workspaces(table, monkeypatch):
+    client = boto3.client("workspaces", region_name = "us-west-2")
+    monkeypatch.setitem(clients._clients, "workspaces", client)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_event_stores_the_state_after_the_call(table, workspaces):
+    workspaces.add_response("describe_workspaces", { "Workspaces": [ _workspace("ws-1", "STARTING") ] },
+                            { "WorkspaceIds": [ "ws-1" ] })
+    inventory.event_handler({ "detail": {
+        "eventName": "StartWorkspaces",
+        "requestParameters": { "startWorkspaceRequests": [ { "workspaceId": "ws-1" } ] }
+    } }, None)
+    assert inventory.get(table, "ws-1")["State"] == "STARTING"
+    assert [ e["WorkspaceId"] for e in inventory.by_user(table, "CORP\\Alice") ] == [ "ws-1" ]
+
+
+def test_recheck_settles_transient_states(table, workspaces):
+    inventory.apply(table, [ "ws-1", "ws-2", "ws-3" ], {
+        "ws-1": _workspace("ws-1", "STARTING"),
+        "ws-2": _workspace("ws-2", "STOPPING", "bob"),
+        "ws-3": _workspace("ws-3", "AVAILABLE", "carol")
+    })
+    workspaces.add_response("describe_workspaces", { "Workspaces": [ _workspace("ws-1", "AVAILABLE") ] },
+                            { "WorkspaceIds": [ "ws-1", "ws-2" ] })
+
+    assert inventory.recheck(table) == { "Rechecked": 2 }
+    assert inventory.get(table, "ws-1")["State"] == "AVAILABLE"
+    assert inventory.get(table, "ws-2") is None
+    assert [ e["WorkspaceId"] for e in inventory.by_state(table, "AVAILABLE") ] in ( [ "ws-1", "ws-3" ], [ "ws-3", "ws-1" ] )
+
+
+def test_recheck_without_transient_states_calls_nothing(table, workspaces):
+    inventory.apply(table, [ "ws-1" ], { "ws-1": _workspace("ws-1", "AVAILABLE") })
+    assert inventory.recheck(table) == { "Rechecked": 0 }
+
+
+def test_reconcile_catches_autostop(table, workspaces):
+    inventory.apply(table, [ "ws-1" ], { "ws-1": _workspace("ws-1", "AVAILABLE") })
+    workspaces.add_response("describe_workspaces", { "Workspaces": [ _workspace("ws-1", "STOPPED") ] }, {})
+    assert inventory.reconcile(table) == { "Scanned": 1, "Changed": 1, "Removed": 0 }
+    assert [ e["WorkspaceId"] for e in inventory.by_state(table, "STOPPED") ] == [ "ws-1" ]
+
+
+def test_endpoint_url_is_passed_explicitly(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    monkeypatch.setenv("AWS_ENDPOINT_URL", "http://localhost:4566")
+    monkeypatch.setenv("AWS_ENDPOINT_URL_DYNAMODB", "http://localhost:8000")
+    assert clients.resource("dynamodb").meta.client.meta.endpoint_url == "http://localhost:8000"
+    assert clients.client("workspaces").meta.endpoint_url == "http://localhost:4566"
+
+
+def test_event_skips_workspaces_of_other_directories(table, workspaces, monkeypatch):
+    monkeypatch.setenv("DIRECTORY_ID", "d-1234567890")
+    other = dict(_workspace("ws-2", "STARTING", "bob"), DirectoryId = "d-0987654321")
+    workspaces.add_response("describe_workspaces", { "Workspaces": [ _workspace("ws-1", "STARTING"), other ] },
+                            { "WorkspaceIds": [ "ws-1", "ws-2" ] })
+    inventory.event_handler({ "detail": {
+        "eventName": "StartWorkspaces",
+        "requestParameters": { "startWorkspaceRequests": [ { "workspaceId": "ws-1" }, { "workspaceId": "ws-2" } ] }
+    } }, None)
+    assert inventory.get(table, "ws-1")["State"] == "STARTING"
+    assert inventory.get(table, "ws-2") is None
@@ -0,0 +1,23 @@
+from WorkSpaces.manifest import WorkSpacesUserEntry, shard
+
+
+def _placement(entries, count):
+    return { e.user: index for index, entries in enumerate(shard(entries, count)) for e in entries }
+
+
+def test_users_keep_their_shard_when_the_manifest_changes():
+    users = [ WorkSpacesUserEntry("LAB\\user{:04d}".format(i)) for i in range(1000) ]
+    before = _placement(users, 10)
+
+    # Remove one user near the start and add new ones in the middle and at the end
+    changed = users[:3] + users[4:500] + [ WorkSpacesUserEntry("LAB\\new{}".format(i)) for i in range(50) ] + users[500:]
+    after = _placement(changed, 10)
+
+    assert all(after[u] == before[u] for u in after if u in before)
+
+
+def test_shards_are_balanced():
+    users = [ WorkSpacesUserEntry("LAB\\user{:04d}".format(i)) for i in range(1000) ]
+    sizes = [ len(s) for s in shard(users, 10) ]
+    assert sum(sizes) == 1000
+    assert max(sizes) < 150
@@ -0,0 +1,109 @@
+import json
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import Stubber
+
+import clients
+import metrics
+
+DIRECTORY = "d-1234567890"
+NOW = datetime(2024, 5, 6, 12, 0, tzinfo = timezone.utc)
+PERIOD = timedelta(minutes = 60)
+
+
+class _SerialPool(object):
+    # Runs the lookups one after the other, so each stubbed client sees its calls in order
+
+    def __init__(self, max_workers = None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    stubbers = {}
+    for service in ( "workspaces", "cloudtrail" ):
+        client = boto3.client(
+            service, region_name = "us-west-2",
+            aws_access_key_id = "test", aws_secret_access_key = "test"
+        )
+        monkeypatch.setitem(clients._clients, service, client)
+        stubbers[service] = Stubber(client)
+        stubbers[service].activate()
+    monkeypatch.setattr(metrics, "ThreadPoolExecutor", _SerialPool)
+    yield stubbers
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
+        stubber.deactivate()
+
+
+def _fleet(stubbed, count):
+    ids = [ "ws-{:03d}".format(i) for i in range(count) ]
+    stubbed["workspaces"].add_response("describe_workspaces", { "Workspaces": [
+        { "WorkspaceId": i, "State": "AVAILABLE" if n % 3 else "STOPPED" } for n, i in enumerate(ids)
+    ] }, { "DirectoryId": DIRECTORY })
+    stubbed["workspaces"].add_response("describe_workspaces_connection_status", { "WorkspacesConnectionStatus": [
+        { "WorkspaceId": i, "ConnectionState": "CONNECTED", "LastKnownUserConnectionTimestamp": NOW - timedelta(seconds = n) }
+        for n, i in enumerate(ids)
+    ] + [ { "WorkspaceId": "ws-other", "ConnectionState": "CONNECTED" } ] }, {})
+    started = NOW - timedelta(minutes = 30)
+    stubbed["cloudtrail"].add_response("lookup_events", { "Events": [ {
+        "EventTime": started,
+        "CloudTrailEvent": json.dumps({ "requestParameters": { "startWorkspaceRequests": [ { "workspaceId": ids[0] } ] } })
+    } ] }, {
+        "LookupAttributes": [ { "AttributeKey": "EventName", "AttributeValue": "StartWorkspaces" } ],
+        "StartTime": NOW - PERIOD
+    })
+    return ids
+
+
+def test_collect_counts_states_and_connections_of_the_directory_only(stubbed):
+    _fleet(stubbed, 6)
+    collected = metrics.collect(DIRECTORY, NOW, PERIOD)
+
+    assert collected["WorkSpaces"] == 6
+    assert collected["State_AVAILABLE"] == 4 and collected["State_STOPPED"] == 2
+    assert collected["Connection_CONNECTED"] == 6
+    assert collected["SecondsSinceLastConnection"] == [ 0.0, 1.0, 2.0, 3.0, 4.0, 5.0 ]
+    assert collected["ResumeToConnectedSeconds"] == [ 1800.0 ]
+
+
+def test_emf_document_shape_and_sampling_cap(stubbed):
+    _fleet(stubbed, 250)
+    document = json.loads(metrics.emf(metrics.collect(DIRECTORY, NOW, PERIOD), DIRECTORY, NOW))
+
+    [ directive ] = document["_aws"]["CloudWatchMetrics"]
+    assert document["_aws"]["Timestamp"] == int(NOW.timestamp() * 1000)
+    assert directive["Namespace"] == metrics.NAMESPACE
+    assert directive["Dimensions"] == [ [ "DirectoryId" ] ]
+    assert document["DirectoryId"] == DIRECTORY
+
+    # Every declared metric has a value at the top level
+    names = [ m["Name"] for m in directive["Metrics"] ]
+    assert all(name in document for name in names)
+    assert { m["Name"]: m["Unit"] for m in directive["Metrics"] }["SecondsSinceLastConnection"] == "Seconds"
+
+    # At most 100 values per metric, spread over the whole range
+    assert len(document["SecondsSinceLastConnection"]) == metrics.MAX_VALUES
+    assert min(document["SecondsSinceLastConnection"]) == 0.0
+    assert max(document["SecondsSinceLastConnection"]) > 240.0
+
+
+def test_emf_leaves_out_metrics_without_values():
+    document = json.loads(metrics.emf({ "WorkSpaces": 0, "ResumeToConnectedSeconds": [] }, DIRECTORY, NOW))
+    assert [ m["Name"] for m in document["_aws"]["CloudWatchMetrics"][0]["Metrics"] ] == [ "WorkSpaces" ]
+    assert "ResumeToConnectedSeconds" not in document
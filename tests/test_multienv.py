@@ -0,0 +1,50 @@
+import argparse
+import threading
+
+from tools import multienv
+
+DEFAULTS = { "Account": "111111111111", "Region": "eu-central-1", "VpcId": "vpc-default" }
+CACHED = {
+    "vpc-provider:account=111111111111:filter.vpc-id=vpc-dev:region=eu-central-1:returnAsymmetricSubnets=true": {}
+}
+
+
+def _args(**kwargs):
+    return argparse.Namespace(**dict(dict(parallel = 3, synth_workers = 3, synth_only = False,
+                                          outdir = "cdk.out", logdir = "logs"), **kwargs))
+
+
+def test_needs_lookup_until_the_vpc_is_cached():
+    assert not multienv.needs_lookup({ "VpcId": "vpc-dev" }, DEFAULTS, CACHED)
+    assert multienv.needs_lookup({ "VpcId": "vpc-prd" }, DEFAULTS, CACHED)
+    assert multienv.needs_lookup({ "VpcId": "vpc-dev", "Account": "222222222222" }, DEFAULTS, CACHED)
+
+
+def test_lookups_synthesize_first_and_deploys_follow_their_own_synth():
+    matrix = { "DEV": { "VpcId": "vpc-dev" }, "QAS": { "VpcId": "vpc-qas" }, "PRD": { "VpcId": "vpc-prd" } }
+    events = []
+    lock = threading.Lock()
+    qas_deploying = threading.Event()
+
+    def synth(name, outdir, logdir):
+        with lock:
+            events.append(( "synth", name ))
+        if name == "DEV":
+            # Holds until QAS deploys, which it only does if its deploy does not wait for every synth
+            assert qas_deploying.wait(5)
+        return ( 1 if name == "PRD" else 0 ), 1.0
+
+    def deploy(name, config, outdir, logdir):
+        with lock:
+            events.append(( "deploy", name ))
+        if name == "QAS":
+            qas_deploying.set()
+        return 0, 2.0
+
+    results = multienv.run([ "DEV", "PRD", "QAS" ], matrix, DEFAULTS, CACHED, _args(), synth, deploy)
+
+    # PRD and QAS need the VPC lookup and synthesize one after the other, before DEV
+    assert events[:2] == [ ( "synth", "PRD" ), ( "synth", "QAS" ) ]
+    assert events.index(( "deploy", "QAS" )) < events.index(( "deploy", "DEV" ))
+    assert { n: r["status"] for n, r in results.items() } == \
+        { "DEV": "DEPLOYED", "PRD": "SYNTH FAILED", "QAS": "DEPLOYED" }
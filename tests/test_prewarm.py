@@ -0,0 +1,26 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import Stubber
+
+import clients
+import prewarm
+
+
+@pytest.fixture
+def workspaces(monkeypatch):
+    client = boto3.client(
+        "workspaces", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+    monkeypatch.setitem(clients._clients, "workspaces", client)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_tag_lookup_survives_throttling(workspaces):
+    workspaces.add_client_error("describe_tags", service_error_code = "ThrottlingException", http_status_code = 400)
+    workspaces.add_response("describe_tags", { "TagList": [ { "Key": "Wave", "Value": "1" } ] }, { "ResourceId": "ws-1" })
+
+    assert prewarm.has_tags(clients.client("workspaces"), "ws-1", { "Wave": "1" }, sleep = lambda seconds: None)
@@ -0,0 +1,118 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import Stubber
+
+import provisioning
+
+DIRECTORY = "d-1234567890"
+
+
+def _request(user):
+    return { "DirectoryId": DIRECTORY, "UserName": user, "BundleId": "wsb-12345678" }
+
+
+def _workspace(user, workspace_id):
+    return dict(_request(user), WorkspaceId = workspace_id, State = "PENDING")
+
+
+def _failure(user, code):
+    return { "WorkspaceRequest": _request(user), "ErrorCode": code, "ErrorMessage": code }
+
+
+@pytest.fixture
+def workspaces():
+    client = boto3.client(
+        "workspaces", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_provision_retries_throttling_and_only_retryable_items(workspaces):
+    client, stubber = workspaces
+    stubber.add_response(
+        "describe_workspaces",
+        { "Workspaces": [ dict(_workspace("Existing", "ws-existing"), State = "AVAILABLE") ] },
+        { "DirectoryId": DIRECTORY }
+    )
+    requests = [ _request(u) for u in ("alice", "bob", "carol", "existing") ]
+    first = requests[:3]
+
+    # The whole call is throttled once, then two items fail, one of them for good
+    stubber.add_client_error("create_workspaces", service_error_code = "ThrottlingException",
+                             http_status_code = 400, expected_params = { "Workspaces": first })
+    stubber.add_response(
+        "create_workspaces",
+        {
+            "PendingRequests": [ _workspace("alice", "ws-alice") ],
+            "FailedRequests": [ _failure("bob", "ThrottlingException"), _failure("carol", "ResourceNotFound.User") ]
+        },
+        { "Workspaces": first }
+    )
+    stubber.add_response(
+        "create_workspaces",
+        { "PendingRequests": [ _workspace("bob", "ws-bob") ], "FailedRequests": [] },
+        { "Workspaces": [ _request("bob") ] }
+    )
+
+    report = provisioning.provision(requests, client, sleep = lambda seconds: None)
+
+    assert [ ws["WorkspaceId"] for ws in report.created ] == [ "ws-alice", "ws-bob" ]
+    assert report.skipped == [ "existing" ]
+    assert report.failed == [ { "UserName": "carol", "ErrorCode": "ResourceNotFound.User", "ErrorMessage": "ResourceNotFound.User" } ]
+    assert report.batches == 2
+
+
+def test_provision_gives_up_on_items_that_stay_throttled(workspaces):
+    client, stubber = workspaces
+    stubber.add_response("describe_workspaces", { "Workspaces": [] }, { "DirectoryId": DIRECTORY })
+    for _ in range(2):
+        stubber.add_response(
+            "create_workspaces",
+            { "PendingRequests": [], "FailedRequests": [ _failure("alice", "ThrottlingException") ] },
+            { "Workspaces": [ _request("alice") ] }
+        )
+
+    report = provisioning.provision([ _request("alice") ], client, max_rounds = 2, sleep = lambda seconds: None)
+
+    assert report.created == []
+    assert [ f["ErrorCode"] for f in report.failed ] == [ "ThrottlingException" ]
+
+
+class _Clock(object):
+    # Advances only when the code under test sleeps
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_wait_survives_throttling_and_reports_timed_out_workspaces(workspaces):
+    client, stubber = workspaces
+    report = provisioning.ProvisioningReport()
+    report.created = [ _workspace("alice", "ws-alice"), _workspace("bob", "ws-bob") ]
+    ids = { "WorkspaceIds": [ "ws-alice", "ws-bob" ] }
+
+    stubber.add_client_error("describe_workspaces", service_error_code = "ThrottlingException",
+                             http_status_code = 400, expected_params = ids)
+    stubber.add_response("describe_workspaces", { "Workspaces": [
+        dict(_workspace("alice", "ws-alice"), State = "AVAILABLE"), _workspace("bob", "ws-bob")
+    ] }, ids)
+    stubber.add_response("describe_workspaces", { "Workspaces": [ _workspace("bob", "ws-bob") ] },
+                         { "WorkspaceIds": [ "ws-bob" ] })
+
+    clock = _Clock()
+    provisioning.wait_until_available(client, report, 0.0, timeout = 50, poll = 30,
+                                      sleep = clock.sleep, clock = clock)
+
+    assert list(report.ready_seconds) == [ "wsb-12345678" ]
+    assert report.timed_out == [ "ws-bob" ]
+    assert report.as_dict()["TimedOut"] == [ "ws-bob" ]
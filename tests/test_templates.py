@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from cfn import synth, find_cycle
+
+# Contexts that switch on the optional stacks and custom resources
+CASES = {
+    "default": {},
+    "domain-controllers": {
+        "DomainControllers": { "count": 3 }
+    },
+    "bundle-pipeline": {
+        "SAPGUIBundle": { "version": "7.70", "builder_workspace_id": "ws-test" }
+    },
+    "monitoring": {
+        "WorkSpacesMonitoring": { "schedule_minutes": 5 }
+    },
+    "inventory": {
+        "WorkSpacesInventory": { "reconcile_minutes": 60, "recheck_minutes": 5 }
+    },
+    "domain-users": {
+        "DomainUsers": [ { "user": "TEST\\user", "email": "user@test.lab" } ]
+    },
+    "prewarm": {
+        "WorkSpacesPrewarm": [
+            { "name": "test", "shift_start": "08:00", "timezone": "Europe/Berlin", "days": "MON-FRI",
+              "lead_minutes": 30, "ramp_minutes": 10, "tags": { "Wave": "test" } }
+        ]
+    }
+}
+
+
+@pytest.mark.parametrize("context", list(CASES.values()), ids = list(CASES))
+def test_no_dependency_cycles(tmp_path, context):
+    # CloudFormation rejects a template whose resources depend on each other in a circle
+    for name, template in synth(tmp_path, **context).items():
+        assert find_cycle(template) is None, name
+
+
+@pytest.mark.parametrize("context", list(CASES.values()), ids = list(CASES))
+def test_self_invoke_is_scoped_to_the_function(tmp_path, context):
+    # Self-invoking functions get lambda:InvokeFunction on their own ARN, not on every function
+    for name, template in synth(tmp_path, **context).items():
+        assert ":function:*" not in json.dumps(template), name
+
+
+def test_users_per_dc_must_be_positive(tmp_path):
+    with pytest.raises(ValueError, match = "users_per_dc must be at least 1"):
+        synth(tmp_path, DomainControllers = { "users_per_dc": 0 })
+
+
+@pytest.mark.parametrize("context, subnets", [
+    ( {}, [ "subnet-11111", "subnet-22222" ] ),
+    ( { "WorkSpacesSubnets": [ [ "subnet-33333", "us-west-2a" ], [ "subnet-44444", "us-west-2b" ] ] },
+      [ "subnet-33333", "subnet-44444" ] )
+], ids = [ "ad-subnets", "workspaces-subnets" ])
+def test_directory_registration_carries_the_subnets(tmp_path, context, subnets):
+    # A property, so changing WorkSpacesSubnets sends the custom resource an Update
+    resources = synth(tmp_path, **context)["AWSManagedAD.template.json"]["Resources"]
+    [ registration ] = [ r for r in resources.values()
+                         if r["Type"] == "AWS::CloudFormation::CustomResource" and "SubnetIds" in r["Properties"] ]
+    assert registration["Properties"]["SubnetIds"] == subnets
+
+
+@pytest.mark.parametrize("fleet", [ False, True ], ids = [ "single", "fleet" ])
+def test_bundle_id_is_not_a_cross_stack_import(tmp_path, fleet):
+    # A version bump replaces the bundle, CloudFormation refuses to change an export still imported
+    context = dict(CASES["bundle-pipeline"])
+    if fleet:
+        manifest = tmp_path / "users.csv"
+        manifest.write_text("user\nTEST\\alice\nTEST\\bob\n")
+        context["WorkSpacesManifest"] = str(manifest)
+    templates = synth(tmp_path / "out", **context)
+
+    bundle_ids = []
+    for template in templates.values():
+        for resource in template["Resources"].values():
+            if resource["Type"] == "AWS::WorkSpaces::Workspace":
+                bundle_ids.append(resource["Properties"]["BundleId"])
+            elif resource["Type"] == "AWS::CloudFormation::Stack":
+                bundle_ids.append(resource["Properties"]["Parameters"]["BundleId"])
+    assert bundle_ids
+    for bundle_id in bundle_ids:
+        assert "Fn::ImportValue" not in json.dumps(bundle_id)
+    assert "Export" not in json.dumps(templates["SAPGUIBundlePipeline.template.json"].get("Outputs", {}))
+
+
+def test_initial_passwords_are_stored_under_their_prefix(tmp_path):
+    resources = synth(tmp_path, **CASES["domain-users"])["AWSManagedAD.template.json"]["Resources"]
+    [ policy ] = [ r for k, r in resources.items() if k.startswith("InitialPasswordsForDomainUsers") ]
+    [ statement ] = policy["Properties"]["PolicyDocument"]["Statement"]
+    assert statement["Action"] == [ "secretsmanager:CreateSecret", "secretsmanager:PutSecretValue" ]
+    assert "secret:workspaces/initial-password/*" in json.dumps(statement["Resource"])
+
+
+def test_dashboard_name_is_unique_per_landscape(tmp_path):
+    # Several environments or landscapes can share a region
+    template = synth(tmp_path, **CASES["monitoring"])["WorkSpacesMonitoring.template.json"]
+    [ dashboard ] = [ r for r in template["Resources"].values() if r["Type"] == "AWS::CloudWatch::Dashboard" ]
+    assert dashboard["Properties"]["DashboardName"] == "WorkSpacesMonitoring-us-west-2"
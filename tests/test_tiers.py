@@ -0,0 +1,23 @@
+import pytest
+
+from WorkSpaces.tiers import load_tiers
+
+
+class _Node(object):
+
+    def __init__(self, **context):
+        self.context = context
+
+    def try_get_context(self, key):
+        return self.context.get(key)
+
+
+def test_load_tiers_accepts_known_running_modes():
+    tiers = { "power": { "running_mode": "ALWAYS_ON" }, "standard": { "running_mode": "AUTO_STOP" }, "plain": {} }
+    assert load_tiers(_Node(WorkSpacesTiers = tiers, WorkSpacesDefaultTier = "standard")) == ( tiers, "standard" )
+
+
+@pytest.mark.parametrize("mode", [ "MANUAL", "ALWAYS-ON", "auto_stop" ])
+def test_load_tiers_rejects_unknown_running_modes(mode):
+    with pytest.raises(ValueError, match = "Tier power has running_mode {}, expected one of ALWAYS_ON, AUTO_STOP".format(mode)):
+        load_tiers(_Node(WorkSpacesTiers = { "power": { "running_mode": mode } }))
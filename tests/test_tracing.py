@@ -0,0 +1,82 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.config import Config
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.stub import Stubber
+
+import tracing
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", True)
+    memory = tracing.MemorySink()
+    previous = tracing.set_sink(memory)
+    yield memory
+    tracing.set_sink(previous)
+
+
+def _client(**kwargs):
+    return tracing.instrument(boto3.client(
+        "workspaces", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test", **kwargs
+    ))
+
+
+def test_successful_call_is_recorded(sink):
+    client = _client()
+    with Stubber(client) as stubber:
+        stubber.add_response("describe_tags", { "TagList": [], "ResponseMetadata": { "RequestId": "req-1" } },
+                             { "ResourceId": "ws-1" })
+        client.describe_tags(ResourceId = "ws-1")
+
+    [ record ] = sink.of("aws_call")
+    assert record["service"] == "workspaces"
+    assert record["operation"] == "DescribeTags"
+    assert record["status"] == 200
+    assert record["error"] is None
+    assert record["request_id"] == "req-1"
+    assert record["ms"] >= 0
+
+
+def test_client_error_is_recorded_with_its_code(sink):
+    client = _client()
+    with Stubber(client) as stubber:
+        stubber.add_client_error("describe_tags", service_error_code = "ThrottlingException", http_status_code = 400)
+        with pytest.raises(ClientError):
+            client.describe_tags(ResourceId = "ws-1")
+
+    [ record ] = sink.of("aws_call")
+    assert record["operation"] == "DescribeTags"
+    assert record["status"] == 400
+    assert record["error"] == "ThrottlingException"
+
+
+def test_connection_error_is_raised_and_recorded(sink):
+    # Nothing listens on the discard port, the call fails before any response
+    client = _client(endpoint_url = "http://127.0.0.1:9",
+                     config = Config(connect_timeout = 1, retries = { "max_attempts": 0 }))
+    with pytest.raises(EndpointConnectionError):
+        client.describe_tags(ResourceId = "ws-1")
+
+    [ record ] = sink.of("aws_call")
+    assert record["operation"] == "DescribeTags"
+    assert record["status"] is None
+    assert record["error"] == "EndpointConnectionError"
+
+
+def test_disabled_tracing_adds_no_hooks(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    memory = tracing.MemorySink()
+    previous = tracing.set_sink(memory)
+    try:
+        client = _client()
+        with Stubber(client) as stubber:
+            stubber.add_response("describe_tags", { "TagList": [] }, { "ResourceId": "ws-1" })
+            client.describe_tags(ResourceId = "ws-1")
+        with tracing.timed("cfn_response", request_id = "r") as record:
+            record["status"] = "SUCCESS"
+    finally:
+        tracing.set_sink(previous)
+    assert memory.records == []
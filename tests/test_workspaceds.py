@@ -0,0 +1,159 @@
+import os
+import sys
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import ANY, Stubber
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+import clients
+import workspaceds
+from fakeaws import FakeContext, cfn_event
+
+DIRECTORY = "d-1234567890"
+SUBNETS = [ "subnet-0aaaaaaa", "subnet-0bbbbbbb" ]
+
+
+@pytest.fixture
+def workspaces(monkeypatch):
+    client = boto3.client(
+        "workspaces", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+    monkeypatch.setitem(clients._clients, "workspaces", client)
+    monkeypatch.setenv("DIRECTORY_ID", DIRECTORY)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    sent = []
+    monkeypatch.setattr(workspaceds.cfnresponse, "send",
+                        lambda event, context, status, data, physical_id = None, **kwargs: sent.append(( status, data )) or True)
+    return sent
+
+
+def _directory(stubber, state, subnets = SUBNETS):
+    stubber.add_response(
+        "describe_workspace_directories",
+        { "Directories": [ { "DirectoryId": DIRECTORY, "State": state, "SubnetIds": subnets } ] },
+        { "DirectoryIds": [ DIRECTORY ] }
+    )
+
+
+def test_create_registers_with_the_subnets_property(workspaces, responses, monkeypatch):
+    # Current botocore no longer knows EnableWorkDocs, the pinned one the function runs with does
+    registered = []
+    monkeypatch.setattr(clients._clients["workspaces"], "register_workspace_directory",
+                        lambda **kwargs: registered.append(kwargs) or {})
+    workspaces.add_response("describe_workspace_directories", { "Directories": [] }, { "DirectoryIds": [ DIRECTORY ] })
+    _directory(workspaces, "REGISTERED")
+    workspaceds.handler(cfn_event("Create", "http://localhost/cfn", SubnetIds = SUBNETS), FakeContext())
+    assert registered == [ { "DirectoryId": DIRECTORY, "EnableWorkDocs": False, "SubnetIds": SUBNETS } ]
+    assert [ status for status, _ in responses ] == [ "SUCCESS" ]
+
+
+def test_update_with_the_same_subnets_succeeds(workspaces, responses):
+    _directory(workspaces, "REGISTERED", list(reversed(SUBNETS)))
+    workspaceds.handler(cfn_event("Update", "http://localhost/cfn", SubnetIds = SUBNETS), FakeContext())
+    assert [ status for status, _ in responses ] == [ "SUCCESS" ]
+
+
+def test_update_with_other_subnets_fails(workspaces, responses):
+    _directory(workspaces, "REGISTERED")
+    workspaceds.handler(cfn_event("Update", "http://localhost/cfn", SubnetIds = [ "subnet-0ccccccc", "subnet-0ddddddd" ]),
+                        FakeContext())
+    [ ( status, data ) ] = responses
+    assert status == "FAILED"
+    assert "registered with subnets subnet-0aaaaaaa,subnet-0bbbbbbb, not subnet-0ccccccc,subnet-0ddddddd" in data["Status"]
+
+
+# Delete: terminate the WorkSpaces on the directory, wait until they are gone, then deregister
+
+def _workspaces(stubber, states):
+    stubber.add_response(
+        "describe_workspaces",
+        { "Workspaces": [ { "WorkspaceId": i, "DirectoryId": DIRECTORY, "State": s } for i, s in states ] },
+        { "DirectoryId": DIRECTORY }
+    )
+
+
+def _terminate(stubber, ids, failed = ()):
+    stubber.add_response(
+        "terminate_workspaces",
+        { "FailedRequests": [ { "WorkspaceId": i, "ErrorCode": "InternalError" } for i in failed ] },
+        { "TerminateWorkspaceRequests": [ { "WorkspaceId": i } for i in ids ] }
+    )
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(workspaceds.time, "sleep", slept.append)
+    return slept
+
+
+def test_teardown_terminates_in_batches_of_25_and_waits_until_gone(workspaces, no_sleep):
+    ids = [ "ws-{:03d}".format(i) for i in range(30) ]
+    _directory(workspaces, "REGISTERED")
+    _workspaces(workspaces, [ ( i, "AVAILABLE" ) for i in ids ])
+    _terminate(workspaces, ids[:25])
+    _terminate(workspaces, ids[25:])
+    _workspaces(workspaces, [ ( i, "TERMINATING" ) for i in ids[25:] ])
+    _workspaces(workspaces, [ ( ids[-1], "TERMINATED" ) ])
+    workspaces.add_response("deregister_workspace_directory", {}, { "DirectoryId": DIRECTORY })
+
+    assert workspaceds.teardown(DIRECTORY, FakeContext(), max_in_flight = 1)
+    assert len(no_sleep) == 2
+
+
+def test_teardown_of_a_deregistered_directory_is_a_no_op(workspaces):
+    _directory(workspaces, "DEREGISTERED")
+    assert workspaceds.teardown(DIRECTORY, FakeContext())
+
+
+def test_teardown_of_an_unregistered_directory_is_a_no_op(workspaces):
+    workspaces.add_response("describe_workspace_directories", { "Directories": [] }, { "DirectoryIds": [ DIRECTORY ] })
+    assert workspaceds.teardown(DIRECTORY, FakeContext())
+
+
+def test_failed_terminate_is_attempted_again_by_the_next_invocation(workspaces, no_sleep):
+    # The first invocation runs out of time while ws-2 is still there
+    _directory(workspaces, "REGISTERED")
+    _workspaces(workspaces, [ ( "ws-1", "AVAILABLE" ), ( "ws-2", "AVAILABLE" ) ])
+    _terminate(workspaces, [ "ws-1", "ws-2" ], failed = [ "ws-2" ])
+    assert not workspaceds.teardown(DIRECTORY, FakeContext(10))
+
+    # The next one terminates only what is not on its way out yet
+    _directory(workspaces, "REGISTERED")
+    _workspaces(workspaces, [ ( "ws-1", "TERMINATING" ), ( "ws-2", "AVAILABLE" ) ])
+    _terminate(workspaces, [ "ws-2" ])
+    _workspaces(workspaces, [])
+    workspaces.add_response("deregister_workspace_directory", {}, { "DirectoryId": DIRECTORY })
+    assert workspaceds.teardown(DIRECTORY, FakeContext())
+
+
+def test_delete_hands_off_before_the_deadline(workspaces, responses, no_sleep, monkeypatch):
+    lam = boto3.client(
+        "lambda", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+    monkeypatch.setitem(clients._clients, "lambda", lam)
+    _directory(workspaces, "REGISTERED")
+    _workspaces(workspaces, [ ( "ws-1", "AVAILABLE" ) ])
+    _terminate(workspaces, [ "ws-1" ])
+
+    context = FakeContext(10)
+    with Stubber(lam) as invoke:
+        invoke.add_response("invoke", { "StatusCode": 202 }, {
+            "FunctionName": context.invoked_function_arn, "InvocationType": "Event", "Payload": ANY
+        })
+        workspaceds.handler(cfn_event("Delete", "http://localhost/cfn", SubnetIds = SUBNETS), context)
+        invoke.assert_no_pending_responses()
+
+    # The continuation responds to CloudFormation, this invocation must not
+    assert responses == []
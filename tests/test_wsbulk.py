@@ -0,0 +1,84 @@
+import argparse
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+from botocore.stub import Stubber
+
+from tools import wsbulk
+
+
+def _args(action = "migrate", **kwargs):
+    args = dict(action = action, profiles = [ None ], regions = [ "us-west-2" ], directory = "d-1234567890",
+                tags = {}, users = None, ids = None, bundle = "wsb-new", running_mode = None,
+                auto_stop_minutes = None, compute_type = None, root_volume = None, user_volume = None)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def _client():
+    return boto3.client(
+        "workspaces", region_name = "us-west-2",
+        aws_access_key_id = "test", aws_secret_access_key = "test"
+    )
+
+
+def test_run_id_depends_on_selectors_and_parameters():
+    assert wsbulk.run_id(_args()) == wsbulk.run_id(_args())
+    assert wsbulk.run_id(_args(regions = [ "eu-west-1", "us-west-2" ])) == \
+        wsbulk.run_id(_args(regions = [ "us-west-2", "eu-west-1" ]))
+    assert wsbulk.run_id(_args()) != wsbulk.run_id(_args(bundle = "wsb-other"))
+    assert wsbulk.run_id(_args()) != wsbulk.run_id(_args(directory = "d-0987654321"))
+    assert wsbulk.run_id(_args()) != wsbulk.run_id(_args(action = "reboot"))
+
+
+def test_default_checkpoint_is_per_run():
+    first = wsbulk.parse_args([ "reboot", "--regions", "us-west-2", "--directory", "d-1" ])
+    second = wsbulk.parse_args([ "reboot", "--regions", "us-west-2", "--directory", "d-2" ])
+    assert first.checkpoint != second.checkpoint
+    named = wsbulk.parse_args([ "reboot", "--regions", "us-west-2", "--directory", "d-1", "--run-id", "night" ])
+    assert named.checkpoint == ".wsbulk-reboot-night.json"
+
+
+def test_checkpoint_clear_removes_the_file(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = wsbulk.Checkpoint(path)
+    checkpoint.record("default/us-west-2", [ "ws-1" ], {})
+    assert wsbulk.Checkpoint(path).target("default/us-west-2")["done"] == [ "ws-1" ]
+    checkpoint.clear()
+    assert wsbulk.Checkpoint(path).target("default/us-west-2")["done"] == []
+
+
+def test_migrate_skips_workspaces_on_the_target_bundle():
+    client = _client()
+    with Stubber(client) as stubber:
+        stubber.add_response("describe_workspaces", { "Workspaces": [
+            { "WorkspaceId": "ws-old", "UserName": "alice", "BundleId": "wsb-old" },
+            { "WorkspaceId": "ws-migrated", "UserName": "bob", "BundleId": "wsb-new" }
+        ] }, { "DirectoryId": "d-1234567890" })
+        stubber.add_response("migrate_workspace", { "SourceWorkspaceId": "ws-old", "TargetWorkspaceId": "ws-target" },
+                             { "SourceWorkspaceId": "ws-old", "BundleId": "wsb-new" })
+        result = wsbulk.run_target("default/us-west-2", client, "migrate", _args(), wsbulk.Checkpoint(None),
+                                   rate = 100, concurrency = 1, log = lambda *a: None)
+        stubber.assert_no_pending_responses()
+    assert result == ( 1, 0 )
+
+
+def test_tag_selection_survives_throttling_and_goes_through_the_limiter():
+    client = _client()
+    acquired = []
+    with Stubber(client) as stubber:
+        stubber.add_response("describe_workspaces", { "Workspaces": [
+            { "WorkspaceId": "ws-1", "UserName": "alice", "BundleId": "wsb-old" },
+            { "WorkspaceId": "ws-2", "UserName": "bob", "BundleId": "wsb-old" }
+        ] }, { "DirectoryId": "d-1234567890" })
+        stubber.add_client_error("describe_tags", service_error_code = "ThrottlingException", http_status_code = 400,
+                                 expected_params = { "ResourceId": "ws-1" })
+        stubber.add_response("describe_tags", { "TagList": [ { "Key": "Wave", "Value": "1" } ] }, { "ResourceId": "ws-1" })
+        stubber.add_response("describe_tags", { "TagList": [ { "Key": "Wave", "Value": "2" } ] }, { "ResourceId": "ws-2" })
+
+        selected = wsbulk.select(client, "d-1234567890", { "Wave": "1" }, acquire = lambda: acquired.append(1))
+        stubber.assert_no_pending_responses()
+
+    assert selected == [ "ws-1" ]
+    assert len(acquired) == 3
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# Break an end-to-end deployment down into phases, from the CloudFormation
+# stack events of the last deployment of each stack.
+#
+#   $ python3 tools/deploy_timing.py --profile <AWS Profile> AWSManagedAD AWSWorkSpaces
+#
+
+import argparse
+
+import boto3
+
+# Logical ID prefix -> phase, in deployment order, None to ignore
+PHASES = [
+    ( "ManagedAD", "Managed AD directory" ),
+    ( "DomainControllers", "Additional domain controllers" ),
+    ( "WindowsEC2", "Admin instance" ),
+    ( "WindowJoinAD", "Admin instance domain join" ),
+    ( "DomainUsers", "Domain users" ),
+    ( "InvokeLambdaFunction", "WorkSpaces directory registration" ),
+    ( "SAPGUIBundle", "SAP GUI bundle" ),
+    ( "WorkSpacesDefaultRole", None ),
+    ( "WorkSpaces", "WorkSpaces" )
+]
+
+START_STATES = ( "CREATE_IN_PROGRESS", "UPDATE_IN_PROGRESS" )
+END_STATES = ( "CREATE_COMPLETE", "UPDATE_COMPLETE", "CREATE_FAILED", "UPDATE_FAILED" )
+
+
+def last_deployment(cfn, stack):
+    # Events are returned newest first, stop at the start of the latest stack operation
+    events = []
+    for page in cfn.get_paginator("describe_stack_events").paginate(StackName = stack):
+        for event in page["StackEvents"]:
+            events.append(event)
+            if event["LogicalResourceId"] == stack and event["ResourceStatus"] in START_STATES:
+                return list(reversed(events))
+    return list(reversed(events))
+
+
+def phase_of(logical_id):
+    for prefix, phase in PHASES:
+        if logical_id.startswith(prefix):
+            return phase
+    return None
+
+
+def phases(events):
+    # Earliest start and latest end of the resources in each phase
+    spans = {}
+    for event in events:
+        phase = phase_of(event["LogicalResourceId"])
+        if phase is None:
+            continue
+        start, end = spans.get(phase, ( None, None ))
+        if event["ResourceStatus"] in START_STATES and start is None:
+            start = event["Timestamp"]
+        if event["ResourceStatus"] in END_STATES:
+            end = event["Timestamp"]
+        spans[phase] = ( start, end )
+    return spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Per-phase timing of the last deployment")
+    parser.add_argument("stacks", nargs = "+")
+    parser.add_argument("--profile")
+    parser.add_argument("--region")
+    args = parser.parse_args()
+
+    cfn = boto3.Session(profile_name = args.profile, region_name = args.region).client("cloudformation")
+
+    spans = {}
+    for stack in args.stacks:
+        spans.update(phases(last_deployment(cfn, stack)))
+
+    found = [ ( phase, spans[phase] ) for _, phase in PHASES if phase in spans and all(spans[phase]) ]
+    if not found:
+        print("No deployment events found")
+        return
+    started = min(start for _, ( start, _ ) in found)
+    finished = max(end for _, ( _, end ) in found)
+
+    print("{:<36} {:>10} {:>10}".format("Phase", "Start +s", "Duration s"))
+    for phase, ( start, end ) in found:
+        print("{:<36} {:>10.0f} {:>10.0f}".format(
+            phase, (start - started).total_seconds(), (end - start).total_seconds()))
+    print("{:<36} {:>10} {:>10.0f}".format("Total", "", (finished - started).total_seconds()))
+
+
+if __name__ == "__main__":
+    main()
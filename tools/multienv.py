@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+#
+# Synthesize and deploy several SAP landscapes from the Environments matrix in
+# cdk.json. Each environment is synthesized into its own cloud assembly and is
+# deployed as soon as its own synth finishes, while the others still synthesize.
+# cdk synth writes context lookups to cdk.context.json, so environments whose VPC
+# lookup is not cached yet are synthesized one at a time before the rest.
+#
+#   $ python3 tools/multienv.py                     # all environments
+#   $ python3 tools/multienv.py DEV QAS --parallel 2
+#   $ python3 tools/multienv.py --synth-only
+#
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# File where the CDK CLI caches context lookups such as Vpc.from_lookup
+CONTEXT_FILE = "cdk.context.json"
+
+
+def _run(command, log_path):
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        log.write("$ {}\n".format(" ".join(command)))
+        log.flush()
+        rc = subprocess.call(command, stdout = log, stderr = subprocess.STDOUT)
+    return rc, time.perf_counter() - started
+
+
+def synth(name, outdir, logdir):
+    command = [ "cdk", "synth", "--quiet", "-c", "Environment={}".format(name), "-o", os.path.join(outdir, name) ]
+    return _run(command, os.path.join(logdir, "{}.synth.log".format(name)))
+
+
+def deploy(name, config, outdir, logdir):
+    command = [ "cdk", "deploy", "--app", os.path.join(outdir, name), "--require-approval", "never" ]
+    if config.get("Profile"):
+        command += [ "--profile", config["Profile"] ]
+    command.append("*")
+    return _run(command, os.path.join(logdir, "{}.deploy.log".format(name)))
+
+
+def needs_lookup(config, defaults, cached):
+    # True unless cdk.context.json holds the Vpc.from_lookup result for this environment
+    account = config.get("Account", defaults.get("Account"))
+    region = config.get("Region", defaults.get("Region"))
+    vpc_id = config.get("VpcId", defaults.get("VpcId"))
+    for key in cached:
+        fields = key.split(":")
+        if fields[0] == "vpc-provider" and "account={}".format(account) in fields \
+                and "region={}".format(region) in fields and "filter.vpc-id={}".format(vpc_id) in fields:
+            return False
+    return True
+
+
+def run(names, matrix, defaults, cached, args, synth = synth, deploy = deploy):
+    """Synthesize every environment and deploy each one right after its own synth."""
+    results = { name: { "synth": None, "deploy": None, "status": "SYNTH FAILED" } for name in names }
+    deploys = {}
+
+    with ThreadPoolExecutor(max_workers = args.parallel) as deployer:
+
+        def synthesized(name, rc, seconds):
+            results[name]["synth"] = seconds
+            if rc != 0:
+                return
+            results[name]["status"] = "SYNTHESIZED"
+            if not args.synth_only:
+                deploys[name] = deployer.submit(deploy, name, matrix[name], args.outdir, args.logdir)
+
+        # Lookups write cdk.context.json, one synth at a time until every environment has its VPC cached
+        lookups = [ n for n in names if needs_lookup(matrix[n], defaults, cached) ]
+        for name in lookups:
+            synthesized(name, *synth(name, args.outdir, args.logdir))
+
+        with ThreadPoolExecutor(max_workers = args.synth_workers) as synthesizer:
+            futures = { synthesizer.submit(synth, name, args.outdir, args.logdir): name
+                        for name in names if name not in lookups }
+            for future in as_completed(futures):
+                synthesized(futures[future], *future.result())
+
+        for name, future in deploys.items():
+            rc, seconds = future.result()
+            results[name]["deploy"] = seconds
+            results[name]["status"] = "DEPLOYED" if rc == 0 else "DEPLOY FAILED"
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Synthesize and deploy several environments in parallel")
+    parser.add_argument("environments", nargs = "*", help = "default: all in cdk.json")
+    parser.add_argument("--parallel", type = int, default = 3, help = "environments deployed at once")
+    parser.add_argument("--synth-workers", type = int, default = os.cpu_count(), help = "environments synthesized at once")
+    parser.add_argument("--synth-only", action = "store_true")
+    parser.add_argument("--outdir", default = "cdk.out")
+    parser.add_argument("--logdir", default = "logs")
+    args = parser.parse_args()
+
+    with open("cdk.json") as fp:
+        context = json.load(fp)["context"]
+    matrix = context.get("Environments", {})
+    names = args.environments or sorted(matrix)
+    unknown = [ n for n in names if n not in matrix ]
+    if unknown:
+        parser.error("not in the Environments matrix: {}".format(", ".join(unknown)))
+    os.makedirs(args.logdir, exist_ok = True)
+
+    cached = {}
+    if os.path.exists(CONTEXT_FILE):
+        with open(CONTEXT_FILE) as fp:
+            cached = json.load(fp)
+
+    started = time.perf_counter()
+    results = run(names, matrix, context, cached, args)
+    total = time.perf_counter() - started
+    print("{:<12} {:>9} {:>10}  {:<14} {}".format("Environment", "Synth s", "Deploy s", "Status", "Logs"))
+    for name in names:
+        r = results[name]
+        print("{:<12} {:>9} {:>10}  {:<14} {}".format(
+            name,
+            "{:.0f}".format(r["synth"]) if r["synth"] is not None else "-",
+            "{:.0f}".format(r["deploy"]) if r["deploy"] is not None else "-",
+            r["status"],
+            os.path.join(args.logdir, name + ".*.log")))
+    print("Total wall time: {:.0f} s".format(total))
+    sys.exit(0 if all(r["status"] in ( "DEPLOYED", "SYNTHESIZED" ) for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
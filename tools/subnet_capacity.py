@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# Cache the free IP addresses of the AD and WorkSpaces subnets in cdk.context.json,
+# so `cdk synth` can check the planned fleet against them offline. The free IPs
+# exclude deployed WorkSpaces, so the planned WorkSpaces that exist already are
+# counted per subnet too.
+#
+#   $ python3 tools/subnet_capacity.py --profile <AWS Profile>
+#
+
+import argparse
+import json
+import os
+import sys
+
+import boto3
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from WorkSpaces.manifest import load_manifest
+
+CONTEXT_KEYS = [ "Subnet1", "Subnet2" ]
+
+
+def planned_users(context):
+    # User names of the fleet in cdk.json, without a NETBIOS\ prefix
+    if context.get("WorkSpacesManifest"):
+        users = [ e.user for e in load_manifest(context["WorkSpacesManifest"]) ]
+    else:
+        users = [ context.get("WorkSpacesUser") ]
+    return set(u.split("\\")[-1].lower() for u in users if u)
+
+
+def deployed_workspaces(client, subnet_ids, users):
+    # Planned WorkSpaces that exist already, per subnet
+    counts = {}
+    for page in client.get_paginator("describe_workspaces").paginate():
+        for ws in page["Workspaces"]:
+            if ws["State"] == "TERMINATED" or ws.get("SubnetId") not in subnet_ids:
+                continue
+            if ws["UserName"].lower() in users:
+                counts[ws["SubnetId"]] = counts.get(ws["SubnetId"], 0) + 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Cache subnet capacity for the CDK app")
+    parser.add_argument("--profile")
+    parser.add_argument("--cdk-json", default = "cdk.json")
+    parser.add_argument("--context-file", default = "cdk.context.json")
+    args = parser.parse_args()
+
+    with open(args.cdk_json) as fp:
+        context = json.load(fp)["context"]
+
+    subnet_ids = [ context[k][0] for k in CONTEXT_KEYS if k in context ]
+    subnet_ids += [ s[0] for s in context.get("WorkSpacesSubnets", []) ]
+
+    session = boto3.Session(profile_name = args.profile, region_name = context.get("Region"))
+    deployed = deployed_workspaces(session.client("workspaces"), set(subnet_ids), planned_users(context))
+    capacity = {
+        s["SubnetId"]: {
+            "az": s["AvailabilityZone"],
+            "cidr": s["CidrBlock"],
+            "available": s["AvailableIpAddressCount"],
+            "workspaces": deployed.get(s["SubnetId"], 0)
+        }
+        for s in session.client("ec2").describe_subnets(SubnetIds = subnet_ids)["Subnets"]
+    }
+
+    cached = {}
+    if os.path.exists(args.context_file):
+        with open(args.context_file) as fp:
+            cached = json.load(fp)
+    cached["SubnetCapacity"] = capacity
+    with open(args.context_file, "w") as fp:
+        json.dump(cached, fp, indent = 2)
+
+    for subnet_id, c in sorted(capacity.items()):
+        print("{:<26} {:<14} {:<18} {:>6} free {:>6} WorkSpaces".format(
+            subnet_id, c["az"], c["cidr"], c["available"], c["workspaces"]))
+
+
+if __name__ == "__main__":
+    main()
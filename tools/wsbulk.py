@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+#
+# Bulk operations on WorkSpaces: reboot, rebuild, migrate, modify and terminate,
+# across accounts (AWS profiles) and regions, with a rate limit per target and a
+# checkpoint file so an interrupted run resumes where it stopped. The checkpoint
+# is keyed by the run and removed once the run completes without failures.
+#
+#   $ python3 tools/wsbulk.py reboot --profiles prd --regions eu-central-1 --tag Wave=1
+#   $ python3 tools/wsbulk.py migrate --bundle wsb-xxxxxxxxx --manifest users.csv
+#
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "lambda"))
+
+from retry import call_with_backoff, chunks, has_tags
+from WorkSpaces.manifest import load_manifest
+
+
+def _requests(key):
+    return lambda ids, args: { key: [ { "WorkspaceId": i } for i in ids ] }
+
+
+def _modify(ids, args):
+    props = {}
+    if args.running_mode:
+        props["RunningMode"] = args.running_mode
+    if args.auto_stop_minutes:
+        props["RunningModeAutoStopTimeoutInMinutes"] = args.auto_stop_minutes
+    if args.compute_type:
+        props["ComputeTypeName"] = args.compute_type
+    if args.root_volume:
+        props["RootVolumeSizeGib"] = args.root_volume
+    if args.user_volume:
+        props["UserVolumeSizeGib"] = args.user_volume
+    return { "WorkspaceId": ids[0], "WorkspaceProperties": props }
+
+
+# action -> (client method, IDs per call, request builder)
+ACTIONS = {
+    "reboot": ( "reboot_workspaces", 25, _requests("RebootWorkspaceRequests") ),
+    "rebuild": ( "rebuild_workspaces", 1, _requests("RebuildWorkspaceRequests") ),
+    "terminate": ( "terminate_workspaces", 25, _requests("TerminateWorkspaceRequests") ),
+    "migrate": ( "migrate_workspace", 1, lambda ids, args: { "SourceWorkspaceId": ids[0], "BundleId": args.bundle } ),
+    "modify": ( "modify_workspace_properties", 1, _modify )
+}
+
+
+class RateLimiter(object):
+    # Token bucket shared by the threads working on one target
+
+    def __init__(self, rate, burst = 1, clock = time.monotonic, sleep = time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class Checkpoint(object):
+    # Done and failed WorkSpace IDs per target, written after every call
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as fp:
+                self.state = json.load(fp)
+
+    def target(self, name):
+        with self.lock:
+            return self.state.setdefault(name, { "done": [], "failed": {} })
+
+    def record(self, name, done, failed):
+        with self.lock:
+            target = self.state.setdefault(name, { "done": [], "failed": {} })
+            target["done"].extend(done)
+            target["failed"].update(failed)
+            if self.path:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w") as fp:
+                    json.dump(self.state, fp)
+                os.replace(tmp, self.path)
+
+    def clear(self):
+        with self.lock:
+            self.state = {}
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def select(client, directory = None, tags = None, users = None, ids = None, skip_bundle = None, acquire = None):
+    """IDs of the WorkSpaces matching all given selectors, except those on skip_bundle.
+
+    Tags take one DescribeTags call per WorkSpace, each goes through acquire if given.
+    """
+    users = set(u.lower() for u in users) if users else None
+    kwargs = { "DirectoryId": directory } if directory else {}
+    selected = []
+    for page in client.get_paginator("describe_workspaces").paginate(**kwargs):
+        for ws in page["Workspaces"]:
+            if ids and ws["WorkspaceId"] not in ids:
+                continue
+            if users is not None and ws["UserName"].lower() not in users:
+                continue
+            if skip_bundle and ws.get("BundleId") == skip_bundle:
+                continue
+            selected.append(ws["WorkspaceId"])
+    if tags:
+        selected = [ i for i in selected if has_tags(client, i, tags, acquire) ]
+    return selected
+
+
+def run_target(name, client, action, args, checkpoint, rate, concurrency, log = print):
+    method, per_call, build = ACTIONS[action]
+    done = set(checkpoint.target(name)["done"])
+    limiter = RateLimiter(rate, burst = concurrency)
+
+    # A migrated WorkSpace gets a new ID, so migrate also skips the WorkSpaces on the target bundle
+    skip_bundle = args.bundle if action == "migrate" else None
+    selected = select(client, args.directory, args.tags, args.users, args.ids, skip_bundle, limiter.acquire)
+    ids = [ i for i in selected if i not in done ]
+    log("{}: {} WorkSpaces to {}, {} already done".format(name, len(ids), action, len(done)))
+
+    def call(batch):
+        limiter.acquire()
+        try:
+            response = call_with_backoff(getattr(client, method), **build(batch, args))
+            failed = { f.get("WorkspaceId", f.get("WorkspaceRequest", {}).get("WorkspaceId")): f.get("ErrorCode")
+                       for f in response.get("FailedRequests", []) }
+        except Exception as e:
+            failed = { i: str(e) for i in batch }
+        checkpoint.record(name, [ i for i in batch if i not in failed ], failed)
+        return len(batch) - len(failed), len(failed)
+
+    with ThreadPoolExecutor(max_workers = concurrency) as pool:
+        results = list(pool.map(call, chunks(ids, per_call)))
+    succeeded = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    log("{}: {} succeeded, {} failed".format(name, succeeded, failed))
+    return succeeded, failed
+
+
+def run(action, args, client_factory, targets, checkpoint, rate = 2.0, concurrency = 4, parallel_targets = 4):
+    """Run action on every target, client_factory(profile, region) returns a WorkSpaces client."""
+    def one(target):
+        profile, region = target
+        name = "{}/{}".format(profile or "default", region)
+        return run_target(name, client_factory(profile, region), action, args, checkpoint, rate, concurrency)
+
+    with ThreadPoolExecutor(max_workers = parallel_targets) as pool:
+        return dict(zip(targets, pool.map(one, targets)))
+
+
+def run_id(args):
+    # Same action, targets, selectors and parameters -> same run, and so the same checkpoint
+    key = { k: getattr(args, k) for k in ( "action", "profiles", "regions", "directory", "tags", "users", "ids",
+                                          "bundle", "running_mode", "auto_stop_minutes", "compute_type",
+                                          "root_volume", "user_volume" ) }
+    for k in ( "profiles", "regions", "users", "ids" ):
+        key[k] = sorted(str(v) for v in key[k]) if key[k] else key[k]
+    return hashlib.sha256(json.dumps(key, sort_keys = True).encode()).hexdigest()[:12]
+
+
+def boto3_factory(profile, region):
+    import boto3
+    return boto3.Session(profile_name = profile, region_name = region).client("workspaces")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description = "Bulk WorkSpaces operations")
+    parser.add_argument("action", choices = sorted(ACTIONS))
+    parser.add_argument("--profiles", nargs = "+", default = [ None ], help = "AWS profiles, one per account")
+    parser.add_argument("--regions", nargs = "+", required = True)
+    parser.add_argument("--directory")
+    parser.add_argument("--tag", action = "append", default = [], help = "Key=Value, all must match")
+    parser.add_argument("--manifest", help = "user manifest, selects the WorkSpaces of its users")
+    parser.add_argument("--ids", nargs = "+")
+    parser.add_argument("--rate", type = float, default = 2.0, help = "API calls per second per target")
+    parser.add_argument("--concurrency", type = int, default = 4)
+    parser.add_argument("--parallel-targets", type = int, default = 4)
+    parser.add_argument("--run-id", help = "names the checkpoint, default a hash of action, targets, selectors and parameters")
+    parser.add_argument("--checkpoint", help = "progress file, default .wsbulk-<action>-<run id>.json")
+    parser.add_argument("--bundle", help = "target bundle for migrate")
+    parser.add_argument("--running-mode", choices = [ "AUTO_STOP", "ALWAYS_ON" ])
+    parser.add_argument("--auto-stop-minutes", type = int)
+    parser.add_argument("--compute-type")
+    parser.add_argument("--root-volume", type = int)
+    parser.add_argument("--user-volume", type = int)
+    args = parser.parse_args(argv)
+
+    if args.action == "migrate" and not args.bundle:
+        parser.error("migrate needs --bundle")
+    if not (args.directory or args.tag or args.manifest or args.ids):
+        parser.error("select WorkSpaces with --directory, --tag, --manifest or --ids")
+
+    args.tags = dict(t.split("=", 1) for t in args.tag)
+    args.users = [ e.user.split("\\")[-1] for e in load_manifest(args.manifest) ] if args.manifest else None
+    args.run_id = args.run_id or run_id(args)
+    args.checkpoint = args.checkpoint or ".wsbulk-{}-{}.json".format(args.action, args.run_id)
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    targets = [ ( p, r ) for p in args.profiles for r in args.regions ]
+    checkpoint = Checkpoint(args.checkpoint)
+    results = run(args.action, args, boto3_factory, targets, checkpoint,
+                  args.rate, args.concurrency, args.parallel_targets)
+    if any(failed for _, failed in results.values()):
+        print("Failures are kept in {}, run the same command again to retry them".format(args.checkpoint))
+        sys.exit(1)
+    checkpoint.clear()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])